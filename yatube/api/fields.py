@@ -0,0 +1,101 @@
+"""Поля ресурсов API и выбор их через ?fields=.
+
+Каждое поле — колонка для values(), в том числе через связь
+(author__username), и необязательное преобразование значения. Связанные
+объекты поэтому приходят тем же запросом через JOIN, а не отдельным
+запросом на строку, и из БД читаются только выбранные колонки.
+"""
+from collections import namedtuple
+
+from posts.models import Post
+
+Field = namedtuple('Field', ('column', 'convert'), defaults=(None,))
+
+
+class InvalidQuery(Exception):
+    """Неверные параметры запроса к API."""
+    status = 400
+
+
+class NotAuthenticated(InvalidQuery):
+    """Ресурс доступен только авторизованным."""
+    status = 401
+
+
+def image_url(image):
+    if not image:
+        return None
+    return Post._meta.get_field('image').storage.url(str(image))
+
+
+POST_FIELDS = {
+    'id': Field('id'),
+    'text': Field('text'),
+    'created': Field('created'),
+    'updated': Field('updated'),
+    'author': Field('author__username'),
+    'group': Field('group__slug'),
+    'image': Field('image', image_url),
+    'image_width': Field('image_width'),
+    'image_height': Field('image_height'),
+    'comments_count': Field('comments_count'),
+}
+GROUP_FIELDS = {
+    'id': Field('id'),
+    'slug': Field('slug'),
+    'title': Field('title'),
+    'description': Field('description'),
+}
+PROFILE_FIELDS = {
+    'username': Field('username'),
+    'first_name': Field('first_name'),
+    'last_name': Field('last_name'),
+    'posts_count': Field('profile__posts_count'),
+    'followers_count': Field('profile__followers_count'),
+    'following_count': Field('profile__following_count'),
+}
+COMMENT_FIELDS = {
+    'id': Field('id'),
+    'post': Field('post_id'),
+    'author': Field('author__username'),
+    'text': Field('text'),
+    'created': Field('created'),
+}
+
+
+def selected_fields(request, fields):
+    """Имена полей из ?fields=a,b или все поля ресурса."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(fields)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',')))
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise InvalidQuery(f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def columns(fields, names, *extra):
+    """Колонки для values(): выбранные поля и служебные extra."""
+    return list(dict.fromkeys(
+        [fields[name].column for name in names] + list(extra)))
+
+
+def serialize(row, fields, names):
+    """Словарь ответа из строки values() или объекта модели."""
+    result = {}
+    for name in names:
+        field = fields[name]
+        value = row[field.column] if isinstance(row, dict) else lookup(
+            row, field.column)
+        result[name] = field.convert(value) if field.convert else value
+    return result
+
+
+def lookup(obj, column):
+    """Значение колонки values() у объекта: author__username и т. п."""
+    for part in column.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, part)
+    return obj
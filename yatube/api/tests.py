@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from posts.models import Comment, Follow, Group, Post, User
+
+POSTS = reverse('api_v1:post_list')
+AUTHOR = 'author'
+READER = 'reader'
+SLUG = 'group'
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=AUTHOR, first_name='Анна')
+        cls.reader = User.objects.create_user(username=READER)
+        cls.group = Group.objects.create(
+            title='Группа', slug=SLUG, description='Описание')
+        now = timezone.now()
+        # Одинаковое время у двух постов проверяет порядок по id.
+        Post.objects.bulk_create(
+            Post(
+                author=cls.author, text=f'Пост {i}',
+                group=cls.group if i % 2 else None,
+                created=now - timedelta(minutes=i // 2)
+            )
+            for i in range(5)
+        )
+        cls.post = Post.objects.order_by('-created', '-id').first()
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def walk(self, url, **params):
+        """Все страницы списка по курсорам next."""
+        results, after = [], None
+        while True:
+            query = dict(params, **({'after': after} if after else {}))
+            data = self.client.get(url, query).json()
+            results += data['results']
+            after = data['next']
+            if after is None:
+                return results
+
+    def test_keyset_paging(self):
+        """Курсоры обходят ленту без пропусков и повторов."""
+        ids = [post['id'] for post in self.walk(POSTS, limit=2)]
+        expected = list(Post.objects.order_by(
+            '-created', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_sparse_fields(self):
+        """?fields= сужает и ответ, и колонки запроса."""
+        with self.assertNumQueries(1) as context:
+            data = self.client.get(
+                POSTS, {'fields': 'id,author', 'limit': 1}).json()
+        self.assertEqual(
+            data['results'], [{'id': self.post.pk, 'author': AUTHOR}])
+        sql = context.captured_queries[0]['sql']
+        self.assertNotIn('"text"', sql)
+        self.assertIn('"username"', sql)
+
+    def test_invalid_query(self):
+        """Неизвестные поля и битые параметры — 400 с описанием."""
+        for params in (
+            {'fields': 'id,password'},
+            {'limit': 'many'},
+            {'limit': 1000},
+            {'after': '!!!'},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(POSTS, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_resources(self):
+        """Группы, профили, комментарии и вложенные ленты."""
+        cases = (
+            (reverse('api_v1:group_list'), lambda data: data['results'][0][
+                'slug'], SLUG),
+            (reverse('api_v1:group_posts', args=[SLUG]),
+             lambda data: len(data['results']), 2),
+            (reverse('api_v1:profile_detail', args=[AUTHOR]),
+             lambda data: data['first_name'], 'Анна'),
+            (reverse('api_v1:profile_posts', args=[AUTHOR]),
+             lambda data: len(data['results']), 5),
+            (reverse('api_v1:post_comments', args=[self.post.pk]),
+             lambda data: data['results'][0]['author'], READER),
+            (reverse('api_v1:post_detail', args=[self.post.pk]),
+             lambda data: data['text'], self.post.text),
+        )
+        for url, extract, expected in cases:
+            with self.subTest(url=url):
+                self.assertEqual(extract(self.client.get(url).json()),
+                                 expected)
+
+    def test_not_found(self):
+        """Несуществующие объекты — 404 в JSON."""
+        for url in (
+            reverse('api_v1:post_detail', args=[0]),
+            reverse('api_v1:group_posts', args=['missing']),
+            reverse('api_v1:profile_detail', args=['missing']),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_follow_feed(self):
+        """Лента подписок — только для авторизованных."""
+        url = reverse('api_v1:follow_feed')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        posts = self.walk(url, limit=2, fields='id,group')
+        self.assertEqual(len(posts), 5)
+        self.assertEqual(set(posts[0]), {'id', 'group'})
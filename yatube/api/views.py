@@ -0,0 +1,171 @@
+import functools
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from api.fields import (
+    COMMENT_FIELDS, GROUP_FIELDS, POST_FIELDS, PROFILE_FIELDS, InvalidQuery,
+    NotAuthenticated, columns, selected_fields, serialize
+)
+from core.decorators import query_budget
+from posts.models import Comment, Group, Post, User
+from posts.timeline import TIMELINE_KEYS, timeline_feed
+from posts.utils import (
+    FEED_KEYS, CursorPaginator, decode_cursor, encode_position, keyset_filter
+)
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def api_view(view):
+    """JSON-ответ из словаря, который вернула view; ошибки — тоже JSON."""
+    @require_GET
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except InvalidQuery as error:
+            return JsonResponse({'error': str(error)}, status=error.status)
+        except Http404:
+            return JsonResponse({'error': 'Не найдено'}, status=404)
+    return wrapper
+
+
+def page_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise InvalidQuery('limit должен быть числом')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise InvalidQuery(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return limit
+
+
+def page_position(request):
+    after = request.GET.get('after')
+    if not after:
+        return None
+    position = decode_cursor(after)
+    if position is None:
+        raise InvalidQuery('Неверный курсор after')
+    return position
+
+
+def keyset_page(request, rows, fields, keys=FEED_KEYS):
+    """Страница строк новее-к-старым после курсора ?after= одним запросом.
+
+    В values() попадают только выбранные поля и ключи сортировки.
+    """
+    names = selected_fields(request, fields)
+    limit = page_limit(request)
+    position = page_position(request)
+    rows = rows.order_by(*[f'-{key}' for key in keys])
+    if position is not None:
+        rows = rows.filter(keyset_filter(keys, position))
+    rows = list(rows.values(*columns(fields, names, *keys))[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': [serialize(row, fields, names) for row in rows],
+        'next': encode_position(
+            *(rows[-1][key] for key in keys)) if has_next else None,
+    }
+
+
+def detail(request, rows, fields):
+    names = selected_fields(request, fields)
+    row = rows.values(*columns(fields, names)).first()
+    if row is None:
+        raise Http404
+    return serialize(row, fields, names)
+
+
+@api_view
+@query_budget(1)
+def post_list(request):
+    return keyset_page(request, Post.objects.all(), POST_FIELDS)
+
+
+@api_view
+@query_budget(1)
+def post_detail(request, post_id):
+    return detail(request, Post.objects.filter(pk=post_id), POST_FIELDS)
+
+
+@api_view
+@query_budget(2)
+def post_comments(request, post_id):
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return keyset_page(
+        request, Comment.objects.filter(post_id=post_id), COMMENT_FIELDS)
+
+
+@api_view
+@query_budget(1)
+def group_list(request):
+    names = selected_fields(request, GROUP_FIELDS)
+    limit = page_limit(request)
+    groups = Group.objects.order_by('slug')
+    if request.GET.get('after'):
+        groups = groups.filter(slug__gt=request.GET['after'])
+    rows = list(groups.values(
+        *columns(GROUP_FIELDS, names, 'slug'))[:limit + 1])
+    has_next = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'results': [serialize(row, GROUP_FIELDS, names) for row in rows],
+        'next': rows[-1]['slug'] if has_next else None,
+    }
+
+
+@api_view
+@query_budget(1)
+def group_detail(request, slug):
+    return detail(request, Group.objects.filter(slug=slug), GROUP_FIELDS)
+
+
+@api_view
+@query_budget(2)
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return keyset_page(
+        request, Post.objects.filter(group_id=group.pk), POST_FIELDS)
+
+
+@api_view
+@query_budget(1)
+def profile_detail(request, username):
+    return detail(
+        request, User.objects.filter(username=username), PROFILE_FIELDS)
+
+
+@api_view
+@query_budget(2)
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return keyset_page(
+        request, Post.objects.filter(author_id=author.pk), POST_FIELDS)
+
+
+@api_view
+@query_budget(6)
+def follow_feed(request):
+    """Лента подписок текущего пользователя.
+
+    Она собирается из Timeline и постов популярных авторов, как
+    follow_index, поэтому посты читаются целиком, а ?fields= только
+    сужает ответ.
+    """
+    if not request.user.is_authenticated:
+        raise NotAuthenticated('Нужна авторизация')
+    names = selected_fields(request, POST_FIELDS)
+    page_position(request)
+    page = CursorPaginator(
+        timeline_feed(request.user), page_limit(request), TIMELINE_KEYS
+    ).get_cursor_page(request.GET.get('after'))
+    return {
+        'results': [serialize(post, POST_FIELDS, names) for post in page],
+        'next': page.next_cursor,
+    }
@@ -0,0 +1,109 @@
+import functools
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.views.decorators.http import condition
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    """Вью сделала больше запросов к БД, чем ей отведено."""
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper, запоминающая SQL запросов вью.
+
+    Точки сохранения транзакций и запросы к таблицам из
+    QUERY_BUDGET_IGNORED_TABLES (например, кэшу миниатюр) не считаются.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.ignored = [
+            f'"{table}"' for table in
+            getattr(settings, 'QUERY_BUDGET_IGNORED_TABLES', ())
+        ]
+
+    def __call__(self, execute, sql, params, many, context):
+        if not (
+            sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO'))
+            or any(table in sql for table in self.ignored)
+        ):
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+
+def counted_chunks(chunks, counter, check):
+    """Тело потокового ответа, запросы которого считает counter.
+
+    Обёртка ставится на каждый next(), а не на весь генератор: между
+    кусками ответа соединение может понадобиться чужому коду.
+    """
+    chunks = iter(chunks)
+    while True:
+        with connection.execute_wrapper(counter):
+            chunk = next(chunks, counted_chunks)
+        if chunk is counted_chunks:
+            break
+        yield chunk
+    check()
+
+
+def query_budget(limit):
+    """Ограничивает число запросов к БД за время работы вью.
+
+    Считаются и запросы из шаблонов, отрисованных внутри вью, и запросы
+    генератора потокового ответа: их бюджет проверяется, когда тело
+    отдано целиком. При QUERY_BUDGET_RAISE превышение бюджета роняет
+    запрос (и тесты), иначе только пишется предупреждение в лог.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+
+            def check():
+                used = len(counter.queries)
+                if used <= limit:
+                    return
+                message = (
+                    f'{view.__name__} ({request.path}): {used} запросов '
+                    f'к БД при бюджете {limit}'
+                )
+                if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                    raise QueryBudgetExceeded(
+                        '\n'.join([message, *counter.queries]))
+                logger.warning(message)
+
+            with connection.execute_wrapper(counter):
+                response = view(request, *args, **kwargs)
+            if getattr(response, 'streaming', False):
+                response.streaming_content = counted_chunks(
+                    response.streaming_content, counter, check)
+            else:
+                check()
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_page(validators):
+    """Отвечает 304 Not Modified, не вызывая вью, если страница та же.
+
+    validators(request, **kwargs) возвращает пару (etag, last_modified)
+    или None, если объекта нет. Она вызывается один раз на запрос,
+    хотя condition спрашивает ETag и Last-Modified по отдельности.
+    """
+    def validated(request, *args, **kwargs):
+        if not hasattr(request, 'page_validators'):
+            request.page_validators = (
+                validators(request, **kwargs) or (None, None))
+        return request.page_validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: validated(*args, **kwargs)[0],
+        last_modified_func=(
+            lambda *args, **kwargs: validated(*args, **kwargs)[1])
+    )
@@ -1,6 +1,29 @@
 from http import HTTPStatus
 
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.decorators import QueryBudgetExceeded, query_budget
+
+User = get_user_model()
+
+
+@query_budget(1)
+def two_queries(request):
+    User.objects.exists()
+    User.objects.exists()
+    return HttpResponse()
+
+
+def two_queries_chunks():
+    yield str(User.objects.exists())
+    yield str(User.objects.exists())
+
+
+@query_budget(1)
+def streaming_two_queries(request):
+    return StreamingHttpResponse(two_queries_chunks())
 
 
 class ViewTestClass(TestCase):
@@ -8,3 +31,25 @@ class ViewTestClass(TestCase):
         response = self.client.get("/non-existed_page/")
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class QueryBudgetTestClass(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_budget_exceeded_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            two_queries(self.request)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_budget_exceeded_logs(self):
+        with self.assertLogs('core.decorators', level='WARNING'):
+            response = two_queries(self.request)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_streaming_budget(self):
+        response = streaming_two_queries(self.request)
+        with self.assertRaises(QueryBudgetExceeded):
+            b''.join(response.streaming_content)
@@ -0,0 +1,40 @@
+"""Запуск Django в процессах пулов concurrent.futures.
+
+Модуль не импортирует моделей, поэтому его функцию можно передать
+initializer'ом процесса, в котором приложения ещё не загружены.
+"""
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection
+
+
+def setup_django(database):
+    """Настраивает Django в процессе пула на ту же БД, что у родителя.
+
+    Имя БД передаётся явно: у тестовой базы оно отличается от settings.
+    """
+    settings.DATABASES[DEFAULT_DB_ALIAS]['NAME'] = database
+    django.setup()
+
+
+@contextlib.contextmanager
+def pool_map(workers):
+    """Функция map пула из workers процессов или встроенная при workers = 0.
+
+    Процессы запускаются через spawn: форк унаследовал бы соединения
+    с БД родителя.
+    """
+    if not workers:
+        yield map
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=setup_django,
+        initargs=(connection.settings_dict['NAME'],)
+    ) as executor:
+        yield executor.map
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Post, Group, Follow, Comment
+from django.db.models.expressions import RawSQL
+from .models import Post, Group, Follow, Comment, Profile
+from .search import match_expression, matching_ids_sql
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -8,9 +10,18 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('created',)
     empty_value_display = '-пусто-'
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу, а не LIKE по всей таблице."""
+        match = match_expression(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(pk__in=RawSQL(*matching_ids_sql(match))), False
 
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
 admin.site.register(Comment)
 admin.site.register(Follow)
+admin.site.register(Profile)
@@ -0,0 +1,203 @@
+"""Поколения лент для версионированных ключей кэша.
+
+У каждой ленты (index, group:<id>, author:<id>, post:<id>) есть
+счётчик-поколение. Сигналы увеличивают его при изменении постов,
+комментариев и групп, а поколение входит в ключи фрагментов, поэтому
+фрагменты можно хранить часами: после изменения ключ просто не совпадёт.
+Те же поколения версионируют кэш целых страниц для анонимных гостей.
+
+Часами хранить можно только в кэше, общем для всех процессов: с кэшем
+в памяти процесса (LocMemCache) сдвиг поколения в команде или другом
+воркере сюда не дойдёт, и cache_timeout укорачивает срок хранения.
+"""
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from posts.models import Group, Post, User
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+PAGE_CACHE_OUTCOMES = ('hits', 'misses')
+# Вью под cache_anonymous_page, для статистики попаданий.
+PAGE_CACHE_VIEWS = []
+
+
+def public_feeds(post):
+    """Общие ленты, в которых показывается пост."""
+    feeds = ['index', f'author:{post.author_id}']
+    if post.group_id is not None:
+        feeds.append(f'group:{post.group_id}')
+    return feeds
+
+
+def generation_key(feed):
+    return f'feed_generation:{feed}'
+
+
+def shared_cache():
+    """Кэш общий для процессов, а не свой у каждого."""
+    backend = settings.CACHES['default']['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS
+
+
+def cache_timeout(timeout):
+    """Срок хранения, укороченный до LOCAL_CACHE_TIMEOUT для кэша процесса."""
+    if shared_cache():
+        return timeout
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+def new_generation():
+    # Поколение не увеличивается, а заменяется новым значением: incr
+    # файлового кэша — чтение и запись, и два процесса, сдвинувшие ленту
+    # одновременно, записали бы одно и то же поколение. Новое значение
+    # не совпадает и со старым, вытесненным из кэша.
+    return time.time_ns()
+
+
+def get_generations(*feeds):
+    """Текущие поколения лент в порядке feeds."""
+    keys = [generation_key(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    missing = {key: new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return tuple(found[key] for key in keys)
+
+
+def bump_generations(*feeds):
+    """Переводит ленты на новое поколение."""
+    cache.set_many(
+        {generation_key(feed): new_generation() for feed in set(feeds)},
+        None)
+
+
+def page_key(request, generations):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{path}:' + '-'.join(map(str, generations))
+
+
+def increment(key, delta=1):
+    """Увеличивает бессрочный счётчик в кэше."""
+    if not cache.add(key, delta, None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, None)
+
+
+def count_page_cache(view, outcome):
+    """Увеличивает счётчик попаданий (hits) или промахов (misses)."""
+    increment(f'page_cache_stats:{view}:{outcome}')
+
+
+def page_cache_stats(views):
+    """Попадания и промахи кэша страниц: {view: (hits, misses)}."""
+    keys = [
+        f'page_cache_stats:{view}:{outcome}'
+        for view in views for outcome in PAGE_CACHE_OUTCOMES
+    ]
+    found = cache.get_many(keys)
+    return {
+        view: tuple(
+            found.get(f'page_cache_stats:{view}:{outcome}', 0)
+            for outcome in PAGE_CACHE_OUTCOMES
+        )
+        for view in views
+    }
+
+
+def reset_page_cache_stats(views):
+    cache.delete_many([
+        f'page_cache_stats:{view}:{outcome}'
+        for view in views for outcome in PAGE_CACHE_OUTCOMES
+    ])
+
+
+def cacheable(request, response):
+    """Ответ можно отдать другому гостю: без кук сессии и CSRF."""
+    session = getattr(request, 'session', None)
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header('Set-Cookie')
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not (session is not None and session.modified)
+    )
+
+
+def index_page_feeds():
+    return ['index']
+
+
+def group_page_feeds(slug):
+    group = Group.objects.filter(slug=slug).values_list('pk', flat=True)
+    for pk in group:
+        return [f'group:{pk}']
+
+
+def profile_page_feeds(username):
+    author = User.objects.filter(
+        username=username).values_list('pk', flat=True)
+    for pk in author:
+        return [f'author:{pk}']
+
+
+def post_page_feeds(post_id):
+    # На странице поста есть счётчик постов автора и его группа.
+    author = Post.objects.filter(
+        pk=post_id).values_list('author_id', flat=True)
+    for pk in author:
+        return [f'post:{post_id}', f'author:{pk}']
+
+
+def page_feeds(request, feeds, **kwargs):
+    """Имена лент страницы: feeds(**kwargs) вызывается раз на запрос.
+
+    Их спрашивают и валидаторы conditional_page, и cache_anonymous_page,
+    а feeds ищет в базе группу, автора или пост.
+    """
+    if not hasattr(request, 'page_feeds'):
+        request.page_feeds = feeds(**kwargs)
+    return request.page_feeds
+
+
+def cache_anonymous_page(feeds, shared=False):
+    """Кэширует страницу целиком для анонимных GET-запросов.
+
+    Ключ — путь с query string и поколения лент, которые вернула
+    feeds(**kwargs); если она вернула None (например, объекта нет),
+    страница рендерится без кэша. shared=True — страница одинакова
+    для всех, и авторизованные получают ту же копию из кэша.
+    """
+    def decorator(view):
+        PAGE_CACHE_VIEWS.append(view.__name__)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or (
+                    not shared and request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            names = page_feeds(request, feeds, **kwargs)
+            if names is None:
+                return view(request, *args, **kwargs)
+            key = page_key(request, get_generations(*names))
+            response = cache.get(key)
+            if response is not None:
+                count_page_cache(view.__name__, 'hits')
+                return response
+            count_page_cache(view.__name__, 'misses')
+            response = view(request, *args, **kwargs)
+            if cacheable(request, response):
+                cache.set(
+                    key, response, cache_timeout(settings.PAGE_CACHE_TIMEOUT))
+            return response
+        return wrapper
+    return decorator
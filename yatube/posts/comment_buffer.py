@@ -0,0 +1,177 @@
+"""Буферизованная запись комментариев (групповой коммит).
+
+При COMMENT_BUFFER вью не пишет комментарий сама, а ставит его в очередь
+процесса и ждёт. Единственный поток-писатель забирает из очереди всё,
+что накопилось, до COMMENT_BUFFER_BATCH штук, и пишет одной транзакцией
+через bulk_create: пока идёт одна запись, следующие комментарии копятся
+в очереди. Порядок сохраняется — очередь FIFO, а писатель один.
+Вью отвечает только после коммита пачки, так что принятый комментарий
+уже лежит в БД; при ошибке записи каждая вью пачки получает свою
+CommentNotSaved. Комментарий, который не дождался писателя за
+COMMENT_BUFFER_TIMEOUT, убирается из очереди, и его можно отправить
+снова, не боясь дубля. Если писатель уже взял его в пачку, вью ждёт
+исхода этой транзакции.
+"""
+import queue
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import Http404
+
+from posts import counters
+from posts.cache import bump_generations
+from posts.models import Comment, Post
+
+
+class CommentNotSaved(Exception):
+    """Комментарий точно не записан, и его можно отправить снова."""
+
+
+class PendingComment:
+    """Комментарий в очереди и событие его записи."""
+
+    def __init__(self, comment):
+        self.comment = comment
+        self.error = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.taken = self.cancelled = False
+
+    def take(self):
+        """Писатель берёт комментарий в пачку, если вью его ещё ждёт."""
+        with self.lock:
+            self.taken = not self.cancelled
+            return self.taken
+
+    def cancel(self):
+        """Вью отказывается ждать, если писатель комментарий не взял."""
+        with self.lock:
+            self.cancelled = not self.taken
+            return self.cancelled
+
+    def finish(self, error=None):
+        self.error = error
+        self.done.set()
+
+    def wait(self, timeout):
+        if not self.done.wait(timeout):
+            if self.cancel():
+                raise CommentNotSaved(
+                    'Комментарий не записан за отведённое время')
+            self.done.wait()
+        if self.error is not None:
+            raise self.error
+
+
+class CommentBuffer:
+    """Очередь комментариев и поток, который пишет их пачками."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def save(self, comment):
+        """Ставит комментарий в очередь и ждёт коммита его пачки.
+
+        Http404 — если поста уже нет, CommentNotSaved — если запись
+        не удалась или не началась за COMMENT_BUFFER_TIMEOUT.
+        """
+        pending = PendingComment(comment)
+        self.start()
+        self.queue.put(pending)
+        pending.wait(settings.COMMENT_BUFFER_TIMEOUT)
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='comment-buffer', daemon=True)
+                self.thread.start()
+
+    def stop(self):
+        """Дописывает очередь и останавливает поток."""
+        with self.lock:
+            if self.thread is None:
+                return
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        try:
+            while True:
+                batch = self.next_batch()
+                if batch is None:
+                    return
+                self.write(batch)
+        finally:
+            connection.close()
+
+    def batch_size(self):
+        return settings.COMMENT_BUFFER_BATCH
+
+    def next_batch(self):
+        """Первый комментарий очереди и всё, что успело накопиться.
+
+        None вместо пачки — сигнал остановки после записи накопленного.
+        Комментарии, которые вью перестали ждать, пропускаются.
+        """
+        batch = []
+        while not batch:
+            pending = self.queue.get()
+            if pending is None:
+                return None
+            if pending.take():
+                batch.append(pending)
+        while len(batch) < self.batch_size():
+            try:
+                pending = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                self.queue.put(None)
+                break
+            if pending.take():
+                batch.append(pending)
+        return batch
+
+    def write(self, batch):
+        """Пишет пачку одной транзакцией и будит ждущие вью.
+
+        bulk_create не шлёт сигналов, поэтому счётчики комментариев
+        и поколения постов обновляются здесь — по разу на пост.
+        """
+        post_ids = {pending.comment.post_id for pending in batch}
+        try:
+            with transaction.atomic():
+                existing = set(Post.objects.filter(
+                    pk__in=post_ids).values_list('pk', flat=True))
+                accepted = [
+                    pending for pending in batch
+                    if pending.comment.post_id in existing
+                ]
+                added = Counter(
+                    pending.comment.post_id for pending in accepted)
+                Comment.objects.bulk_create(
+                    [pending.comment for pending in accepted])
+                for post_id, count in added.items():
+                    counters.change_comments(post_id, count)
+        except Exception as error:
+            connection.close_if_unusable_or_obsolete()
+            for pending in batch:
+                # У каждой вью своё исключение: одно общее из разных
+                # потоков получило бы перемешанный __traceback__.
+                not_saved = CommentNotSaved('Не удалось записать комментарий')
+                not_saved.__cause__ = error
+                pending.finish(not_saved)
+            return
+        bump_generations(*(f'post:{post_id}' for post_id in added))
+        for pending in batch:
+            pending.finish(
+                None if pending.comment.post_id in existing else Http404())
+
+
+comment_buffer = CommentBuffer()
@@ -0,0 +1,37 @@
+"""Валидаторы условных GET для страниц поста, профиля и группы.
+
+ETag строится из поколений лент страницы (posts.cache): сигналы сдвигают
+их при любой правке, удалении и переносе постов, комментариях,
+подписках и переименованиях, так что валидатор — один запрос, что объект
+существует, и одно чтение кэша; ответ запроса запоминается на request
+для кэша страниц. Last-Modified не отдаётся: время правки последнего
+поста не замечает удалений и изменений вне постов. ETag учитывает
+и пользователя: авторизованные видят на страницах формы и кнопки
+подписки.
+"""
+import hashlib
+
+from posts.cache import (
+    get_generations, group_page_feeds, page_feeds, post_page_feeds,
+    profile_page_feeds
+)
+
+
+def make_etag(request, *parts):
+    parts = (request.user.pk, *parts)
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def feed_validators(feeds):
+    """Валидаторы страницы, которая показывает ленты feeds(**kwargs)."""
+    def validators(request, **kwargs):
+        names = page_feeds(request, feeds, **kwargs)
+        if names is None:
+            return None
+        return make_etag(request, *get_generations(*names)), None
+    return validators
+
+
+post_validators = feed_validators(post_page_feeds)
+profile_validators = feed_validators(profile_page_feeds)
+group_validators = feed_validators(group_page_feeds)
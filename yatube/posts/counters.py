@@ -0,0 +1,143 @@
+"""Денормализованные счётчики постов, комментариев, подписок и ссылок
+на файлы картинок.
+
+Сигналы меняют их точечными UPDATE ... SET x = x ± 1, поэтому профиль
+и страница поста показывают числа без COUNT. Если счётчик разошёлся
+с данными (строки созданы bulk_create, удалены в обход ORM и т. п.),
+reconcile_profiles и reconcile_posts пересчитывают его одним UPDATE
+с подзапросом.
+"""
+import threading
+
+from django.db import connection
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from posts.models import Comment, Follow, MediaBlob, Post, Profile, User
+
+PROFILE_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+BATCH_SIZE = 500
+
+
+class DeletingUsers(threading.local):
+    """Пользователи, которых текущий поток удаляет вместе с их строками."""
+
+    def __init__(self):
+        self.ids = set()
+
+
+deleting = DeletingUsers()
+
+
+def count_of(model, field, outer):
+    """Подзапрос: число строк model, у которых field = OuterRef(outer)."""
+    rows = model.objects.filter(**{field: OuterRef(outer)})
+    return Coalesce(Subquery(
+        rows.order_by().values(field).annotate(
+            total=Count('pk')).values('total')
+    ), 0)
+
+
+def change_profile(user_id, field, delta):
+    """Сдвигает счётчик профиля на delta, при расхождении пересчитывает.
+
+    Профиль удаляемого пользователя уходит в том же каскаде, что его
+    посты и подписки, поэтому его счётчики не трогаются: иначе каскад
+    пересчитывал бы профиль на каждую удалённую строку.
+    """
+    if user_id in deleting.ids and connection.in_atomic_block:
+        return
+    rows = Profile.objects.filter(user_id=user_id)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    if not rows.update(**{field: F(field) + delta}):
+        # На уменьшении недостающий профиль не создаём.
+        reconcile_profiles(
+            User.objects.filter(pk=user_id), create_missing=delta > 0)
+
+
+def change_comments(post_id, delta):
+    """Сдвигает счётчик комментариев поста на delta."""
+    rows = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        rows = rows.filter(comments_count__gte=-delta)
+    if not rows.update(comments_count=F('comments_count') + delta):
+        reconcile_posts(Post.objects.filter(pk=post_id))
+
+
+def change_blob(name, delta):
+    """Сдвигает число ссылок на файл картинки на delta."""
+    rows = MediaBlob.objects.filter(name=name)
+    if delta < 0:
+        rows = rows.filter(refcount__gte=-delta)
+    # updated сдвигается явно: update() не трогает auto_now, а по нему
+    # сборщик мусора не удаляет только что освободившиеся файлы.
+    if not rows.update(refcount=F('refcount') + delta, updated=now()):
+        reconcile_blobs(MediaBlob.objects.filter(name=name), [name])
+
+
+def drifted(rows, field, actual):
+    return rows.annotate(actual=actual).exclude(**{field: F('actual')})
+
+
+def reconcile_profiles(users=None, create_missing=True):
+    """Создаёт недостающие профили и пересчитывает их счётчики.
+
+    Возвращает число исправленных строк для каждого счётчика.
+    """
+    users = User.objects.all() if users is None else users
+    if create_missing:
+        missing = users.filter(
+            profile__isnull=True).values_list('pk', flat=True)
+        Profile.objects.bulk_create(
+            (Profile(user_id=pk) for pk in missing.iterator()),
+            batch_size=BATCH_SIZE
+        )
+    profiles = Profile.objects.filter(user__in=users)
+    fixed = {}
+    for field, (model, lookup) in PROFILE_COUNTERS.items():
+        actual = count_of(model, lookup, 'user')
+        fixed[field] = drifted(profiles, field, actual).count()
+        if fixed[field]:
+            profiles.update(**{field: actual})
+    return fixed
+
+
+def reconcile_posts(posts=None):
+    """Пересчитывает comments_count постов, возвращает число исправленных."""
+    posts = Post.objects.all() if posts is None else posts
+    actual = count_of(Comment, 'post', 'pk')
+    fixed = drifted(posts, 'comments_count', actual).count()
+    if fixed:
+        posts.update(comments_count=actual)
+    return {'comments_count': fixed}
+
+
+def reconcile_blobs(blobs=None, names=None):
+    """Создаёт строки для файлов без них и пересчитывает refcount.
+
+    names — имена картинок, для которых проверяются недостающие строки;
+    по умолчанию все картинки постов.
+    """
+    blobs = MediaBlob.objects.all() if blobs is None else blobs
+    images = Post.objects.exclude(image='')
+    if names is not None:
+        images = images.filter(image__in=names)
+    MediaBlob.objects.bulk_create(
+        (
+            MediaBlob(name=name) for name in images.exclude(
+                image__in=MediaBlob.objects.values('name')
+            ).values_list('image', flat=True).distinct().iterator()
+        ),
+        batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+    actual = count_of(Post, 'image', 'name')
+    fixed = drifted(blobs, 'refcount', actual).count()
+    if fixed:
+        blobs.update(refcount=actual, updated=now())
+    return {'refcount': fixed}
@@ -0,0 +1,162 @@
+"""Ленты RSS и Atom: вся лента сайта, группы и авторы.
+
+Тело ленты рендерится один раз и хранится в кэше под ключом с
+поколениями лент из posts.cache, поэтому новый пост сразу его
+вытесняет. ETag — тот же ключ, так что повторный опрос без изменений
+получает 304, не трогая ни шаблоны, ни тело в кэше.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import quote_etag
+from django.utils.text import Truncator
+
+from posts.cache import (
+    cache_timeout, get_generations, group_page_feeds, index_page_feeds,
+    profile_page_feeds
+)
+from posts.models import Group, Post, User
+
+FEED_TITLE_WORDS = 8
+
+
+def feed_key(request, generations):
+    path = hashlib.md5(request.path.encode()).hexdigest()
+    return f'feed:{path}:' + '-'.join(map(str, generations))
+
+
+def cached_feed(feeds):
+    """Отдаёт ленту из кэша и отвечает 304, пока в ней нет нового.
+
+    feeds(**kwargs) возвращает имена лент, как для cache_anonymous_page,
+    или None, если объекта нет.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            names = feeds(**kwargs)
+            if names is None:
+                raise Http404
+            key = feed_key(request, get_generations(*names))
+            etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return response
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                response['ETag'] = etag
+                cache.set(
+                    key, response, cache_timeout(settings.PAGE_CACHE_TIMEOUT))
+            return response
+        return wrapper
+    return decorator
+
+
+class PostsFeed(Feed):
+    """Последние FEED_ITEMS постов; подклассы сужают выборку."""
+
+    def posts(self, obj):
+        return Post.objects.all()
+
+    def items(self, obj):
+        return self.posts(obj).select_related(
+            'author', 'group')[:settings.FEED_ITEMS]
+
+    def item_title(self, post):
+        return Truncator(post.text).words(FEED_TITLE_WORDS)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=[post.pk])
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_pubdate(self, post):
+        return post.created
+
+    def item_updateddate(self, post):
+        return post.updated
+
+    def item_categories(self, post):
+        return [post.group.title] if post.group else []
+
+
+class IndexFeed(PostsFeed):
+    title = 'Yatube: последние обновления'
+    description = 'Новые посты всех авторов'
+
+    def link(self):
+        return reverse('posts:index')
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def posts(self, group):
+        return group.posts.all()
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=[group.slug])
+
+
+class AuthorFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def posts(self, author):
+        return author.posts.all()
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Посты пользователя {author.username}'
+
+    def link(self, author):
+        return reverse('posts:profile', args=[author.username])
+
+
+class IndexAtomFeed(IndexFeed):
+    feed_type = Atom1Feed
+    subtitle = IndexFeed.description
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, group):
+        return self.description(group)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, author):
+        return self.description(author)
+
+
+index_rss = cached_feed(index_page_feeds)(IndexFeed())
+index_atom = cached_feed(index_page_feeds)(IndexAtomFeed())
+group_rss = cached_feed(group_page_feeds)(GroupFeed())
+group_atom = cached_feed(group_page_feeds)(GroupAtomFeed())
+profile_rss = cached_feed(profile_page_feeds)(AuthorFeed())
+profile_atom = cached_feed(profile_page_feeds)(AuthorAtomFeed())
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
 
+from posts import uploads
 from posts.models import Post, Comment
 
 
@@ -8,6 +12,31 @@ class PostForm(ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Недокачанный файл ImageField счёл бы битой картинкой, поэтому
+        # слишком большой файл до поля не доходит, а ошибку о размере
+        # показывает clean_image.
+        self.oversized_image = self.files.get('image')
+        if self.oversized_image is None or not uploads.oversized(
+                self.oversized_image):
+            self.oversized_image = None
+            return
+        self.files = self.files.copy()
+        del self.files['image']
+
+    def clean_image(self):
+        if self.oversized_image is not None:
+            raise ValidationError(
+                'Файл больше %(limit)s МБ.',
+                code='too_large',
+                params={'limit': settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+            )
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return uploads.process_image(image)
+        return image
+
 
 class CommentForm(ModelForm):
     class Meta:
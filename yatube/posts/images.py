@@ -0,0 +1,87 @@
+"""Метаданные картинок постов: размеры, формат, цвет и заглушка.
+
+Всё считывается один раз при загрузке картинки и хранится в полях Post,
+поэтому шаблоны выводят размеры и заглушку, не открывая файлы медиа.
+"""
+import base64
+import io
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter
+
+# Повёрнутые EXIF-ориентацией картинки показываются с шириной и высотой
+# наоборот.
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+PLACEHOLDER_SIZE = (16, 16)
+PLACEHOLDER_QUALITY = 40
+METADATA_FIELDS = (
+    'image_width', 'image_height', 'image_format', 'image_size',
+    'image_color', 'image_placeholder',
+)
+
+
+def empty_metadata():
+    return {
+        'image_width': None,
+        'image_height': None,
+        'image_format': '',
+        'image_size': None,
+        'image_color': '',
+        'image_placeholder': '',
+    }
+
+
+def read_metadata(file):
+    """Метаданные картинки из открытого файла в виде полей Post."""
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        image_format = image.format or ''
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+        # Для JPEG draft декодирует сразу уменьшенную копию.
+        image.draft('RGB', (PLACEHOLDER_SIZE[0] * 4, PLACEHOLDER_SIZE[1] * 4))
+        small = image.convert('RGB')
+    small.thumbnail(PLACEHOLDER_SIZE)
+    color = small.resize((1, 1), Image.BOX).getpixel((0, 0))
+    buffer = io.BytesIO()
+    small.filter(ImageFilter.GaussianBlur(1)).save(
+        buffer, 'JPEG', quality=PLACEHOLDER_QUALITY)
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_format': image_format,
+        'image_size': file.size,
+        'image_color': '#{:02x}{:02x}{:02x}'.format(*color),
+        'image_placeholder': 'data:image/jpeg;base64,' + base64.b64encode(
+            buffer.getvalue()).decode(),
+    }
+
+
+def fill_metadata(post):
+    """Заполняет поля метаданных поста по его картинке.
+
+    Если файл не читается или лежит вне хранилища, поля остаются
+    пустыми, как у ещё не обработанных постов.
+    """
+    metadata = empty_metadata()
+    if post.image:
+        try:
+            metadata = read_metadata(post.image)
+        except (OSError, SuspiciousFileOperation):
+            pass
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def stored_metadata(name):
+    """Метаданные сохранённой картинки по имени или None, если её не прочесть.
+    """
+    try:
+        with default_storage.open(name) as file:
+            return read_metadata(file)
+    except (OSError, SuspiciousFileOperation):
+        return None
@@ -0,0 +1,46 @@
+"""Общие помощники для команд-бенчмарков."""
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import override_settings
+from faker import Faker
+
+
+@contextmanager
+def benchmark_database(name=None):
+    """Временная тестовая БД: бенчмарк не трогает рабочие данные.
+
+    name — файл БД вместо базы в памяти, например для бенчмарков,
+    в которых в неё пишут несколько потоков.
+    """
+    test_settings = connection.settings_dict['TEST']
+    default_name = test_settings.get('NAME')
+    if name is not None:
+        test_settings['NAME'] = name
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True)
+    try:
+        with override_settings(DEBUG=False):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = default_name
+
+
+def measure(func, repeat=5):
+    """Медиана времени выполнения func в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def fake_texts(count=500, seed=0):
+    """Пул случайных текстов постов, чтобы не звать Faker на каждую строку."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(count)]
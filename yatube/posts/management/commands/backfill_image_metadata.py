@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.workers import pool_map
+from posts.images import METADATA_FIELDS, stored_metadata
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет метаданные картинок у постов, загруженных до их '
+        'появления. Файлы читаются параллельно в пуле процессов; '
+        'повторный запуск продолжает с необработанных постов. '
+        'С --workers 0 файлы читаются в этом процессе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=200)
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').filter(
+            image_width__isnull=True).order_by('pk').values_list(
+            'pk', 'image')
+        filled = skipped = 0
+        last = 0
+        with pool_map(options['workers']) as pool:
+            while True:
+                batch = list(pending.filter(pk__gt=last)[:options['batch']])
+                if not batch:
+                    break
+                last = batch[-1][0]
+                posts = [
+                    Post(pk=pk, **metadata)
+                    for (pk, _), metadata in zip(batch, pool(
+                        stored_metadata, [name for _, name in batch]))
+                    if metadata is not None
+                ]
+                Post.objects.bulk_update(posts, METADATA_FIELDS)
+                filled += len(posts)
+                skipped += len(batch) - len(posts)
+                self.stdout.write(f'Обработано постов: {filled + skipped}')
+        self.stdout.write(
+            f'Метаданные заполнены у {filled} постов, '
+            f'не удалось прочитать {skipped} картинок'
+        )
@@ -0,0 +1,106 @@
+from itertools import cycle, islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from posts.management.commands._bench import (
+    benchmark_database, fake_texts, measure
+)
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает стоимость запросов к JSON API и HTML-страницам '
+        'с теми же данными во временной БД: время, число запросов '
+        'к БД и размер ответа. Кэш очищается перед каждым запросом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            author, reader = self.fill(options['posts'])
+            client = Client()
+            client.force_login(reader)
+            post = Post.objects.order_by('-created', '-id').first()
+            # API отдаёт столько же строк, сколько страница HTML.
+            page = f'?limit={POSTS_PER_PAGE}'
+            pairs = (
+                ('главная', '/', f'/api/v1/posts/{page}'),
+                (
+                    'главная, 2 поля', '/',
+                    f'/api/v1/posts/{page}&fields=id,text'
+                ),
+                (
+                    'группа', '/group/bench/',
+                    f'/api/v1/groups/bench/posts/{page}'
+                ),
+                (
+                    'профиль', f'/profile/{author.username}/',
+                    f'/api/v1/profiles/{author.username}/posts/{page}'
+                ),
+                (
+                    'пост', f'/posts/{post.pk}/',
+                    f'/api/v1/posts/{post.pk}/comments/'
+                    f'?limit={COMMENTS_PER_PAGE}'
+                ),
+                ('подписки', '/follow/', f'/api/v1/follow/{page}'),
+            )
+            self.stdout.write(
+                f'{"страница":<18}{"HTML, мс":>10}{"API, мс":>10}'
+                f'{"запросов":>12}{"байт":>16}'
+            )
+            for title, html, api in pairs:
+                self.report(client, title, html, api, options['repeat'])
+
+    def fill(self, count):
+        author = User.objects.create(username='bench')
+        reader = User.objects.create(username='reader')
+        group = Group.objects.create(
+            title='Бенчмарк', slug='bench', description='')
+        texts = cycle(fake_texts())
+        while count > 0:
+            batch = min(count, BATCH_SIZE)
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(author=author, group=group, text=text)
+                    for text in islice(texts, batch)
+                )
+            count -= batch
+        post = Post.objects.order_by('-created', '-id').first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=reader, text=text)
+            for text in islice(texts, 50)
+        )
+        Follow.objects.create(user=reader, author=author)
+        return author, reader
+
+    def request(self, client, url):
+        cache.clear()
+        return client.get(url)
+
+    def report(self, client, title, html, api, repeat):
+        sizes, queries = [], []
+        for url in (html, api):
+            with CaptureQueriesContext(connection) as context:
+                content = self.request(client, url).content
+            sizes.append(len(content))
+            queries.append(len(context.captured_queries))
+        timings = [
+            measure(lambda: self.request(client, url), repeat)
+            for url in (html, api)
+        ]
+        self.stdout.write(
+            f'{title:<18}{timings[0]:>10.1f}{timings[1]:>10.1f}'
+            f'{queries[0]:>6} / {queries[1]:<3}'
+            f'{sizes[0]:>8} / {sizes[1]:<6}'
+        )
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.comment_buffer import comment_buffer
+from posts.management.commands._bench import benchmark_database
+from posts.models import Comment, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест add_comment: --threads потоков одновременно '
+        'комментируют один пост, сначала с записью по одному, потом '
+        'с COMMENT_BUFFER. Временная БД лежит в файле, как в продакшене.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--comments', type=int, default=100)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'bench_comments.sqlite3')
+        try:
+            with benchmark_database(path):
+                self.run(options['threads'], options['comments'])
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rmdir(directory)
+
+    def run(self, threads, comments):
+        author = User.objects.create(username='streamer')
+        post = Post.objects.create(author=author, text='Прямой эфир')
+        clients = []
+        for number in range(threads):
+            client = Client()
+            client.force_login(
+                User.objects.create(username=f'viewer{number}'))
+            clients.append(client)
+        url = reverse('posts:add_comment', args=[post.pk])
+        self.stdout.write(
+            f'{threads} потоков по {comments} комментариев к одному посту')
+        self.stdout.write(
+            f'{"запись":<12}{"комм./с":>10}{"ошибок":>8}{"порядок":>10}')
+        for buffered in (False, True):
+            with override_settings(COMMENT_BUFFER=buffered):
+                self.report(
+                    'буфер' if buffered else 'по одной',
+                    clients, url, post, comments
+                )
+        comment_buffer.stop()
+
+    def report(self, title, clients, url, post, comments):
+        Comment.objects.filter(post=post).delete()
+        errors = []
+
+        def comment(client, number):
+            for index in range(comments):
+                try:
+                    response = client.post(
+                        url, {'text': f'{number}:{index}'})
+                    if response.status_code != 302:
+                        errors.append(response.status_code)
+                except Exception as error:
+                    errors.append(error)
+
+        workers = [
+            threading.Thread(target=comment, args=(client, number))
+            for number, client in enumerate(clients)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        saved = Comment.objects.filter(post=post).count()
+        self.stdout.write(
+            f'{title:<12}{saved / elapsed:>10.0f}{len(errors):>8}'
+            f'{"да" if self.ordered(post) else "нет":>10}'
+        )
+        post.refresh_from_db()
+        if post.comments_count != saved:
+            self.stderr.write(
+                f'Счётчик {post.comments_count}, комментариев {saved}')
+
+    def ordered(self, post):
+        """Комментарии каждого потока записаны в порядке отправки."""
+        last = {}
+        for text in Comment.objects.filter(post=post).order_by(
+                'id').values_list('text', flat=True).iterator():
+            number, index = map(int, text.split(':'))
+            if index <= last.get(number, -1):
+                return False
+            last[number] = index
+        return True
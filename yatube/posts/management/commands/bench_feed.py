@@ -0,0 +1,129 @@
+import random
+import time
+from itertools import cycle, islice
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from mixer.backend.django import mixer
+
+from posts import timeline
+from posts.counters import reconcile_profiles
+from posts.management.commands._bench import (
+    benchmark_database, fake_texts, measure
+)
+from posts.models import Follow, Post, Timeline, User
+from posts.utils import FEED_KEYS, POSTS_PER_PAGE, CursorPaginator
+
+NO_THRESHOLD = 10 ** 9
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленту подписок pull, push и hybrid на подписках '
+        'со степенным распределением во временной БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=30)
+        parser.add_argument('--posts', type=int, default=20)
+        parser.add_argument('--threshold', type=int, default=200)
+        parser.add_argument('--readers', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with benchmark_database():
+            users = self.populate(options)
+            readers = random.sample(users, options['readers'])
+            top = self.top_author()
+            self.stdout.write(
+                f'{len(users)} пользователей, '
+                f'{Follow.objects.count()} подписок, '
+                f'{Post.objects.count()} постов; '
+                f'у самого популярного автора {top["followers"]} подписчиков'
+            )
+            self.stdout.write(
+                f'{"стратегия":<10}{"строк ленты":>13}{"материализация":>17}'
+                f'{"публикация":>13}{"первая стр.":>14}'
+            )
+            self.report('pull', None, readers)
+            self.report('push', NO_THRESHOLD, readers)
+            self.report('hybrid', options['threshold'], readers)
+
+    def populate(self, options):
+        users = mixer.cycle(options['users']).blend(
+            User, username=mixer.sequence('reader{0}'))
+        # Популярность авторов степенная: немногие собирают большинство
+        # подписок, как в настоящих соцсетях.
+        weights = [random.paretovariate(1.2) for _ in users]
+        follows = set()
+        for user in users:
+            for author in random.choices(
+                    users, weights=weights, k=options['follows']):
+                if author != user:
+                    follows.add((user.pk, author.pk))
+        texts = cycle(fake_texts())
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                Follow(user_id=user, author_id=author)
+                for user, author in follows
+            )
+            Post.objects.bulk_create(
+                (
+                    Post(author=user, text=text)
+                    for user in users
+                    for text in islice(texts, options['posts'])
+                ),
+                batch_size=timeline.BATCH_SIZE
+            )
+        reconcile_profiles()
+        return users
+
+    def report(self, name, threshold, readers):
+        cache.clear()
+        Timeline.objects.all().delete()
+        with override_settings(FEED_FANOUT_THRESHOLD=threshold):
+            start = time.perf_counter()
+            if threshold is not None:
+                with transaction.atomic():
+                    Post.objects.update(fanned_out=True)
+                    Post.objects.filter(
+                        author_id__in=timeline.celebrities()
+                    ).update(fanned_out=False)
+                    for user, author in Follow.objects.values_list(
+                            'user', 'author').iterator():
+                        timeline.backfill(user, author)
+            build = time.perf_counter() - start
+            author = self.top_author()['author']
+            publish = measure(
+                lambda: Post.objects.create(
+                    author_id=author, text='Новость'),
+                repeat=3
+            ) if threshold is not None else 0
+            read = sum(
+                measure(lambda: self.first_page(reader, threshold), 3)
+                for reader in readers
+            ) / len(readers)
+        self.stdout.write(
+            f'{name:<10}{Timeline.objects.count():>13}'
+            f'{build:>15.1f} с{publish:>10.1f} мс{read:>11.1f} мс'
+        )
+
+    def top_author(self):
+        return Follow.objects.values('author').annotate(
+            followers=Count('id')).order_by('-followers')[0]
+
+    def first_page(self, reader, threshold):
+        if threshold is None:
+            posts = Post.objects.filter(
+                author__following__user=reader).select_related('group')
+            keys = FEED_KEYS
+        else:
+            posts = timeline.timeline_feed(reader)
+            keys = timeline.TIMELINE_KEYS
+        return CursorPaginator(
+            posts, POSTS_PER_PAGE, keys).get_cursor_page()
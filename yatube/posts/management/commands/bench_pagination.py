@@ -0,0 +1,78 @@
+from itertools import cycle, islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from posts.management.commands._bench import (
+    benchmark_database, fake_texts, measure
+)
+from posts.models import Post, User
+from posts.utils import POSTS_PER_PAGE, encode_cursor, invalidate_feed_counts
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет время ответа и размер страниц профиля '
+        'на 10k и 1M постов во временной БД.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10_000, 1_000_000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with benchmark_database():
+            author = User.objects.create(username='bench')
+            texts = cycle(fake_texts())
+            client = Client()
+            total = 0
+            for size in sorted(options['sizes']):
+                self.fill(author, texts, size - total)
+                total = size
+                self.report(client, author, size, options['repeat'])
+
+    def fill(self, author, texts, count):
+        while count > 0:
+            batch = min(count, BATCH_SIZE)
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(author=author, text=text)
+                    for text in islice(texts, batch)
+                )
+            count -= batch
+
+    def report(self, client, author, size, repeat):
+        url = f'/profile/{author.username}/'
+        feed = f'author:{author.pk}'
+        pages = -(-size // POSTS_PER_PAGE)
+        deep = Post.objects.filter(author=author).order_by(
+            '-created', '-id')[(pages - 1) * POSTS_PER_PAGE - 1]
+        cases = (
+            ('первая', {}),
+            ('средняя', {'page': pages // 2}),
+            ('последняя', {'page': pages}),
+            ('последняя по курсору', {'after': encode_cursor(deep)}),
+        )
+        self.stdout.write(f'\n{size} постов, {pages} страниц')
+        self.stdout.write(
+            f'{"страница":<22}{"холодный счётчик":>18}'
+            f'{"тёплый счётчик":>16}{"байт":>9}{"ссылок":>8}'
+        )
+        for title, params in cases:
+            def cold():
+                invalidate_feed_counts(feed)
+                return client.get(url, params)
+
+            def warm():
+                return client.get(url, params)
+
+            content = warm().content
+            self.stdout.write(
+                f'{title:<22}{measure(cold, repeat):>15.1f} мс'
+                f'{measure(warm, repeat):>13.1f} мс{len(content):>9}'
+                f'{content.count(b"page-item"):>8}'
+            )
@@ -0,0 +1,100 @@
+import io
+import shutil
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.forms import modelform_factory
+from django.test.utils import override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from posts.images import EXIF_ORIENTATION
+from posts.management.commands._bench import benchmark_database
+from posts.models import Post, User
+
+# Форма без обработки картинки — так PostForm сохраняла загрузки раньше.
+RawPostForm = modelform_factory(Post, fields=('text', 'group', 'image'))
+
+
+def photo(size):
+    """Картинка с шумом, похожая на фото по сжимаемости."""
+    return Image.merge('RGB', [
+        Image.linear_gradient('L').resize(size),
+        Image.effect_noise(size, 40),
+        Image.radial_gradient('L').resize(size),
+    ])
+
+
+def encoded(image, image_format, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def samples():
+    """Типичные загрузки: фото с телефона, скриншот и анимация."""
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    phone = photo((4032, 3024))
+    frames = [photo((800, 600)).convert('P') for _ in range(10)]
+    gif = io.BytesIO()
+    frames[0].save(gif, 'GIF', save_all=True, append_images=frames[1:])
+    return [
+        ('phone.jpg', encoded(
+            phone, 'JPEG', quality=95, exif=exif.tobytes())),
+        ('screen.png', encoded(photo((2560, 1440)), 'PNG')),
+        ('animation.gif', gif.getvalue()),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время загрузки картинки через PostForm и размер '
+        'сохранённого файла с обработкой и без неё.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp()
+        try:
+            with benchmark_database(), override_settings(MEDIA_ROOT=media):
+                author = User.objects.create(username='uploader')
+                self.stdout.write(
+                    f'{"файл":<15}{"исходный":>12}{"форма":>8}'
+                    f'{"время":>11}{"сохранено":>12}'
+                )
+                for name, content in samples():
+                    for label, form_class in (
+                            ('raw', RawPostForm), ('processed', PostForm)):
+                        self.report(
+                            name, content, label, form_class, author,
+                            options['repeat']
+                        )
+        finally:
+            shutil.rmtree(media, ignore_errors=True)
+
+    def report(self, name, content, label, form_class, author, repeat):
+        timings = []
+        for _ in range(repeat):
+            upload = SimpleUploadedFile(name, content)
+            start = time.perf_counter()
+            # Откат отменяет фоновую генерацию миниатюр: она не часть
+            # загрузки и в этом сравнении только шумела бы.
+            with transaction.atomic():
+                form = form_class({'text': 'Картинка'}, {'image': upload})
+                post = form.save(commit=False)
+                post.author = author
+                post.save()
+                transaction.set_rollback(True)
+            timings.append((time.perf_counter() - start) * 1000)
+            stored = post.image.size
+        self.stdout.write(
+            f'{name:<15}{len(content) // 1024:>9} КБ{label:>11}'
+            f'{sorted(timings)[len(timings) // 2]:>8.0f} мс'
+            f'{stored // 1024:>9} КБ'
+        )
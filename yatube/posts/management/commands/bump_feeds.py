@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.cache import bump_generations, shared_cache
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит ленты на новое поколение, чтобы закэшированные '
+        'страницы и фрагменты с ними отрисовались заново, например '
+        'после выкладки шаблонов. Ленты: index, group:<id>, author:<id>, '
+        'post:<id>. Работает только с общим для процессов кэшем (CACHE_DIR).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('feeds', nargs='+', help='Имена лент.')
+
+    def handle(self, *args, **options):
+        if not shared_cache():
+            raise CommandError(
+                'Кэш свой у каждого процесса: веб-воркеры не увидят новых '
+                'поколений. Задайте CACHE_DIR.')
+        bump_generations(*options['feeds'])
+        self.stdout.write(f'Сдвинуто лент: {len(set(options["feeds"]))}')
@@ -0,0 +1,59 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from posts.models import MediaBlob, Post
+from posts.utils import chunked
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из хранилища картинки, на которые не ссылается ни один '
+        'пост, вместе с их миниатюрами. Хранилище обходится потоком, '
+        'ссылки проверяются пачками по индексу post_image_idx. Файлы '
+        'моложе --grace секунд не трогаются: их пост может быть ещё '
+        'не сохранён.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60 * 60)
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=options['grace'])
+        seen = deleted = 0
+        for names in chunked(
+                storage.walk(field.upload_to), options['batch']):
+            seen += len(names)
+            garbage = self.unreferenced(storage, names, cutoff)
+            deleted += len(garbage)
+            if options['dry_run']:
+                for name in garbage:
+                    self.stdout.write(f'Будет удалён {name}')
+                continue
+            for name in garbage:
+                delete(ImageFile(name, storage))
+            MediaBlob.objects.filter(name__in=garbage).delete()
+        self.stdout.write(
+            f'Просмотрено файлов: {seen}, '
+            f'{"к удалению" if options["dry_run"] else "удалено"}: {deleted}'
+        )
+
+    def unreferenced(self, storage, names, cutoff):
+        """Имена из names без постов и без недавних изменений."""
+        kept = set(Post.objects.filter(
+            image__in=names).values_list('image', flat=True))
+        kept.update(MediaBlob.objects.filter(
+            name__in=names, updated__gte=cutoff
+        ).values_list('name', flat=True))
+        return [
+            name for name in names if name not in kept
+            and storage.get_modified_time(name) < cutoff
+        ]
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS, export_lines, export_zip
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты и комментарии пользователя в NDJSON или CSV '
+        'потоком, с --zip — архивом вместе с картинками. Без --output '
+        'пишет в stdout.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--format', choices=tuple(FORMATS), default='ndjson')
+        parser.add_argument('--zip', action='store_true')
+        parser.add_argument('--output')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        if options['zip']:
+            chunks = export_zip(user, options['format'])
+        else:
+            chunks = (
+                line.encode()
+                for line in export_lines(user, options['format'])
+            )
+        output = (
+            open(options['output'], 'wb') if options['output']
+            else sys.stdout.buffer
+        )
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.workers import pool_map
+from posts.cache import bump_generations, public_feeds
+from posts.models import Post
+from posts.thumbnails import generate, in_process
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры картинок всех постов в пуле процессов, '
+        'например после смены размеров в posts.thumbnails.RENDITIONS, '
+        'и сбрасывает кэш лент, где эти посты показываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=200)
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').order_by('pk')
+        workers = 0 if in_process() else settings.THUMBNAIL_WORKERS
+        done = last = 0
+        with pool_map(workers) as pool:
+            while True:
+                batch = list(posts.filter(pk__gt=last).only(
+                    'pk', 'author_id', 'group_id', 'image'
+                )[:options['batch']])
+                if not batch:
+                    break
+                last = batch[-1].pk
+                names = sorted({post.image.name for post in batch})
+                done += len(list(pool(generate, names)))
+                bump_generations(*{
+                    feed
+                    for post in batch
+                    for feed in (*public_feeds(post), f'post:{post.pk}')
+                })
+                self.stdout.write(f'Готово {done}')
+        self.stdout.write(f'Миниатюры созданы для {done} картинок')
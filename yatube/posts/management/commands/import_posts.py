@@ -0,0 +1,234 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import timeline
+from posts.cache import bump_generations
+from posts.counters import reconcile_blobs, reconcile_profiles
+from posts.images import read_metadata
+from posts.models import Follow, Group, MediaBlob, Post, User
+from posts.uploads import process_image
+from posts.utils import chunked, invalidate_feed_counts
+
+FORMATS = ('jsonl', 'csv')
+
+
+def parse_created(value):
+    """Дата публикации из строки ISO 8601 или None, если она неверна."""
+    if not value:
+        return timezone.now()
+    try:
+        created = parse_datetime(value)
+    except ValueError:
+        return None
+    if created is not None and timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+def insert_posts(posts, batch_size):
+    """bulk_create, который сохраняет дату публикации из файла.
+
+    auto_now_add у Post.created при вставке ставит текущее время, поэтому
+    даты из файла возвращаются следом через bulk_update. SQLite не отдаёт
+    id из bulk_create, но вставка держит блокировку записи до конца
+    транзакции, и id постов — последние len(posts) id таблицы. Поэтому
+    функция вызывается внутри transaction.atomic.
+    """
+    dates = [post.created for post in posts]
+    Post.objects.bulk_create(posts, batch_size=batch_size)
+    if posts[0].pk is None:
+        ids = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True)[:len(posts)]
+        for post, pk in zip(posts, reversed(list(ids))):
+            post.pk = pk
+    for post, created in zip(posts, dates):
+        post.created = created
+    Post.objects.bulk_update(posts, ['created'], batch_size=batch_size)
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует посты из JSONL или CSV с полями text, author '
+        '(username), group (slug), created (ISO 8601) и image (путь '
+        'в --images). Файл читается потоком, посты пишутся bulk_create '
+        'пачками в транзакциях по --chunk строк, без сигналов на каждую '
+        'строку: счётчики, ленты подписок и кэш обновляются один раз '
+        'в конце. Миниатюры затем создаёт generate_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdin')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--images', help='Папка с картинками')
+        parser.add_argument('--batch', type=int, default=1000)
+        parser.add_argument('--chunk', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.images = options['images']
+        self.authors = dict(
+            User.objects.values_list('username', 'pk').iterator())
+        self.groups = dict(Group.objects.values_list('slug', 'pk').iterator())
+        self.affected_authors, self.affected_groups = set(), set()
+        self.celebrities = timeline.celebrities()
+        self.skipped = imported = 0
+        # Посты импорта — те, что получат id больше нынешнего последнего.
+        last_id = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        start = time.perf_counter()
+        with self.open(options['path']) as file:
+            rows = self.read(file, self.format(options))
+            posts = filter(None, (self.build(*row) for row in rows))
+            for chunk in chunked(posts, options['chunk']):
+                with transaction.atomic():
+                    insert_posts(chunk, self.batch_size(options, chunk))
+                    images = [post.image.name for post in chunk if post.image]
+                    if images:
+                        reconcile_blobs(
+                            MediaBlob.objects.filter(name__in=images), images)
+                imported += len(chunk)
+                self.progress(imported, start)
+                # При DEBUG Django копит SQL всех запросов в памяти.
+                reset_queries()
+        self.finish(last_id)
+        self.progress(imported, start)
+        self.stdout.write(f'Пропущено строк: {self.skipped}')
+
+    def batch_size(self, options, posts):
+        """--batch, но не больше, чем позволяет БД за один INSERT.
+
+        Django 2.2 не урезает явный batch_size до лимита SQLite.
+        """
+        fields = [
+            field for field in Post._meta.concrete_fields
+            if not field.primary_key
+        ]
+        return min(
+            options['batch'], connection.ops.bulk_batch_size(fields, posts))
+
+    def format(self, options):
+        if options['format']:
+            return options['format']
+        extension = os.path.splitext(options['path'])[1].lstrip('.')
+        if extension not in FORMATS:
+            raise CommandError('Укажите --format: jsonl или csv')
+        return extension
+
+    @contextlib.contextmanager
+    def open(self, path):
+        if path == '-':
+            yield io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+            return
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                yield file
+        except FileNotFoundError:
+            raise CommandError(f'Нет файла {path}')
+
+    def read(self, file, file_format):
+        """Строки файла по одной: (номер строки, словарь полей)."""
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                self.skip(line_number, f'не JSON: {error}')
+                continue
+            if not isinstance(row, dict):
+                self.skip(line_number, 'ожидался объект JSON')
+                continue
+            yield line_number, row
+
+    def skip(self, line_number, reason):
+        self.skipped += 1
+        self.stderr.write(f'Строка {line_number} пропущена: {reason}')
+
+    def build(self, line_number, row):
+        """Несохранённый пост из строки или None, если строку не принять."""
+        text = (row.get('text') or '').strip()
+        author_id = self.authors.get(row.get('author'))
+        group_slug = row.get('group') or None
+        group_id = self.groups.get(group_slug)
+        created = parse_created(row.get('created'))
+        if not text:
+            return self.skip(line_number, 'пустой текст')
+        if author_id is None:
+            return self.skip(line_number, f'нет автора {row.get("author")}')
+        if group_slug is not None and group_id is None:
+            return self.skip(line_number, f'нет группы {group_slug}')
+        if created is None:
+            return self.skip(line_number, f'дата {row["created"]}')
+        post = Post(
+            text=text, author_id=author_id, group_id=group_id,
+            created=created, updated=timezone.now(),
+            fanned_out=author_id not in self.celebrities
+        )
+        if row.get('image'):
+            try:
+                self.attach(post, row['image'])
+            except (OSError, ValidationError) as error:
+                return self.skip(line_number, f'картинка: {error}')
+        self.affected_authors.add(author_id)
+        if group_id is not None:
+            self.affected_groups.add(group_id)
+        return post
+
+    def attach(self, post, relative):
+        """Сохраняет картинку из --images так же, как при загрузке."""
+        if not self.images:
+            raise OSError('не задана папка --images')
+        root = os.path.realpath(self.images)
+        path = os.path.realpath(os.path.join(root, relative))
+        if os.path.commonpath([root, path]) != root:
+            raise OSError(f'{relative} вне папки --images')
+        with open(path, 'rb') as source:
+            image = process_image(File(source, os.path.basename(path)))
+        field = Post._meta.get_field('image')
+        post.image = field.storage.save(
+            field.generate_filename(post, image.name), image)
+        for name, value in read_metadata(image).items():
+            setattr(post, name, value)
+
+    def finish(self, last_id):
+        """То, что сигналы делают для каждого поста, — один раз на импорт.
+
+        По лентам подписчиков раскладываются только посты с id больше
+        last_id, а не все посты затронутых авторов.
+        """
+        authors = self.affected_authors
+        reconcile_profiles(User.objects.filter(pk__in=authors))
+        timeline.fan_out_many(Post.objects.filter(
+            pk__gt=last_id, author_id__in=authors))
+        followers = set(Follow.objects.filter(
+            author_id__in=authors).values_list('user_id', flat=True))
+        feeds = [
+            'index',
+            *(f'author:{author_id}' for author_id in authors),
+            *(f'group:{group_id}' for group_id in self.affected_groups),
+        ]
+        invalidate_feed_counts(
+            *feeds, *(f'follow:{user_id}' for user_id in followers))
+        bump_generations(*feeds)
+
+    def progress(self, imported, start):
+        elapsed = time.perf_counter() - start
+        rate = imported / elapsed if elapsed else 0
+        self.stdout.write(
+            f'Импортировано постов: {imported}, {rate:.0f} строк/с')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import views  # noqa: F401 регистрирует вью в PAGE_CACHE_VIEWS
+from posts.cache import (
+    PAGE_CACHE_VIEWS, page_cache_stats, reset_page_cache_stats
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает попадания и промахи кэша страниц для гостей. '
+        'Счётчики живут в кэше, поэтому видны только при общем для '
+        'процессов бэкенде кэша.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Обнулить счётчики.')
+
+    def handle(self, *args, **options):
+        stats = page_cache_stats(PAGE_CACHE_VIEWS)
+        self.stdout.write(
+            f'{"вью":<14}{"попадания":>11}{"промахи":>10}{"доля":>8}')
+        for view, (hits, misses) in stats.items():
+            total = hits + misses
+            rate = hits / total if total else 0
+            self.stdout.write(
+                f'{view:<14}{hits:>11}{misses:>10}{rate:>8.1%}')
+        if options['reset']:
+            reset_page_cache_stats(PAGE_CACHE_VIEWS)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает полнотекстовый индекс постов, например после '
+        'восстановления базы из резервной копии.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_index()
+        self.stdout.write(f'В индексе {Post.objects.count()} постов')
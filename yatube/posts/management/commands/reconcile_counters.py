@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (
+    reconcile_blobs, reconcile_posts, reconcile_profiles
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики постов, комментариев '
+        'и подписок, ссылок на файлы картинок и исправляет расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        fixed = {
+            **reconcile_profiles(), **reconcile_posts(), **reconcile_blobs()
+        }
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: исправлено строк {rows}')
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import (
+    RENDITIONS, SIZES, prefetch_thumbnails, ready_thumbnail, ready_variants
+)
+
+# Типичные окна: ширина в CSS-пикселях и плотность пикселей экрана.
+DEVICES = (
+    ('телефон', 360, 2),
+    ('планшет', 768, 2),
+    ('ноутбук', 1366, 1),
+)
+
+
+def slot_width(rendition, viewport):
+    """Ширина картинки в CSS-пикселях по правилам SIZES."""
+    for min_width, share in SIZES[rendition]:
+        if min_width is None or viewport >= min_width:
+            return viewport * share / 100
+
+
+def chosen(candidates, needed):
+    """Вариант, который выберет браузер: самый узкий не уже needed."""
+    candidates = sorted(candidates, key=lambda thumbnail: thumbnail.width)
+    for thumbnail in candidates:
+        if thumbnail.width >= needed:
+            return thumbnail
+    return candidates[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Оценивает, сколько байт картинок экономит srcset: для последних '
+        'постов сравнивает основной размер миниатюры с вариантом, который '
+        'выбрал бы браузер на телефоне, планшете и ноутбуке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=200)
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.exclude(image='')[:options['posts']])
+        self.stdout.write(
+            f'{"размер":<8}{"устройство":<10}{"без srcset":>12}'
+            f'{"с srcset":>12}{"экономия":>10}'
+        )
+        for rendition in RENDITIONS:
+            prefetch_thumbnails(posts, rendition)
+            for device, viewport, density in DEVICES:
+                needed = slot_width(rendition, viewport) * density
+                before = after = 0
+                for post in posts:
+                    main = ready_thumbnail(post, rendition)
+                    post_variants = ready_variants(post, rendition)
+                    if main is None or not post_variants:
+                        continue
+                    # Браузер берёт первый поддерживаемый <source>, то есть
+                    # самый современный формат из готовых.
+                    best_format = post_variants[0][0]
+                    candidates = [
+                        thumbnail for image_format, thumbnail in post_variants
+                        if image_format == best_format
+                    ]
+                    before += main.storage.size(main.name)
+                    best = chosen(candidates, needed)
+                    after += best.storage.size(best.name)
+                saved = 100 * (before - after) / before if before else 0
+                self.stdout.write(
+                    f'{rendition:<8}{device:<10}{before // 1024:>9} КБ'
+                    f'{after // 1024:>9} КБ{saved:>9.0f}%'
+                )
@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import delete
+from sorl.thumbnail.images import ImageFile
+
+from core.workers import pool_map
+from posts.cache import bump_generations, public_feeds
+from posts.counters import reconcile_blobs
+from posts.models import MediaBlob, Post
+from posts.storage import SHARDED_NAME, content_storage, shard_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов из плоской папки posts/ в подпапки '
+        'по хешу содержимого (posts/ab/cd/…) и переписывает Post.image '
+        'пачками. Файлы копируются параллельно в пуле процессов, старые '
+        'удаляются только после сохранения новых путей, поэтому прерванный '
+        'перенос можно просто запустить снова. Миниатюры по новым путям '
+        'создаёт generate_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=200)
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').exclude(
+            image__regex=SHARDED_NAME).order_by('pk')
+        moved = missing = 0
+        last = 0
+        with pool_map(options['workers']) as pool:
+            while True:
+                posts = list(pending.filter(pk__gt=last).only(
+                    'pk', 'author_id', 'group_id', 'image'
+                )[:options['batch']])
+                if not posts:
+                    break
+                last = posts[-1].pk
+                names = sorted({post.image.name for post in posts})
+                targets = {
+                    name: target
+                    for name, target in zip(names, pool(shard_file, names))
+                    if target is not None
+                }
+                self.rename(posts, targets)
+                moved += len(targets)
+                missing += len(names) - len(targets)
+                self.stdout.write(f'Перенесено файлов: {moved}')
+        self.stdout.write(
+            f'Перенесено файлов: {moved}, не найдено: {missing}')
+
+    def rename(self, posts, targets):
+        """Переписывает пути постов, затем удаляет старые файлы."""
+        with transaction.atomic():
+            for name, target in targets.items():
+                Post.objects.filter(image=name).update(image=target)
+            MediaBlob.objects.filter(name__in=targets).delete()
+            new_names = list(targets.values())
+            reconcile_blobs(
+                MediaBlob.objects.filter(name__in=new_names), new_names)
+        for name, target in targets.items():
+            if name != target:
+                delete(ImageFile(name, content_storage))
+        # Закэшированные страницы ссылаются на старые пути.
+        bump_generations(*{
+            feed
+            for post in posts if post.image.name in targets
+            for feed in (*public_feeds(post), f'post:{post.pk}')
+        })
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import thumbnail_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает, сколько чтений метаданных миниатюр было пакетными '
+        '(на страницу) и сколько — по одному посту.'
+    )
+
+    def handle(self, *args, **options):
+        stats = thumbnail_stats()
+        batches = stats['batch_lookups']
+        per_batch = stats['batched_posts'] / batches if batches else 0
+        self.stdout.write(
+            f'Пакетных чтений: {batches}, постов в них: '
+            f'{stats["batched_posts"]} (в среднем {per_batch:.1f})\n'
+            f'Чтений по одному посту: {stats["single_lookups"]}'
+        )
@@ -0,0 +1,94 @@
+from django.db import migrations
+
+# Полнотекстовый индекс постов: текст, название группы и имя автора.
+# rowid строки индекса совпадает с id поста. Триггеры держат индекс
+# в актуальном состоянии при любых изменениях, в том числе bulk_create
+# и QuerySet.update(), которые не отправляют сигналов.
+CREATE_SQL = (
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        text, group_title, author_name, tokenize = 'unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+        SELECT new.id, new.text,
+            (SELECT title FROM posts_group WHERE id = new.group_id),
+            (SELECT first_name || ' ' || last_name || ' ' || username
+             FROM auth_user WHERE id = new.author_id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update
+    AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+        SELECT new.id, new.text,
+            (SELECT title FROM posts_group WHERE id = new.group_id),
+            (SELECT first_name || ' ' || last_name || ' ' || username
+             FROM auth_user WHERE id = new.author_id);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER posts_group_fts_update
+    AFTER UPDATE OF title ON posts_group BEGIN
+        UPDATE posts_post_fts SET group_title = new.title
+        WHERE rowid IN (SELECT id FROM posts_post WHERE group_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER auth_user_fts_update
+    AFTER UPDATE OF first_name, last_name, username ON auth_user BEGIN
+        UPDATE posts_post_fts
+        SET author_name = new.first_name || ' ' || new.last_name || ' '
+            || new.username
+        WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+    SELECT posts_post.id, posts_post.text, posts_group.title,
+        auth_user.first_name || ' ' || auth_user.last_name || ' '
+        || auth_user.username
+    FROM posts_post
+    INNER JOIN auth_user ON auth_user.id = posts_post.author_id
+    LEFT JOIN posts_group ON posts_group.id = posts_post.group_id
+    """,
+)
+
+DROP_SQL = (
+    'DROP TRIGGER IF EXISTS auth_user_fts_update',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+)
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0023_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(CREATE_SQL), run_on_sqlite(DROP_SQL)),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:51
+
+from django.db import migrations, models
+
+from posts.search import without_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_post_search'),
+    ]
+
+    operations = without_triggers(
+        migrations.AddField(
+            model_name='post',
+            name='image_color',
+            field=models.CharField(blank=True, editable=False, max_length=7, verbose_name='основной цвет картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_format',
+            field=models.CharField(blank=True, editable=False, max_length=10, verbose_name='формат картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False, verbose_name='размытая миниатюра'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_size',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='размер картинки в байтах'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='ширина картинки'),
+        ),
+    )
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:58
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def fill_blobs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaBlob = apps.get_model('posts', 'MediaBlob')
+    images = Post.objects.exclude(image='').order_by().values(
+        'image').annotate(refcount=Count('pk'))
+    MediaBlob.objects.bulk_create(
+        (MediaBlob(name=row['image'], refcount=row['refcount'])
+         for row in images.iterator()),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_post_image_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='путь в хранилище')),
+                ('refcount', models.PositiveIntegerField(default=0, verbose_name='число ссылок')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Файл картинки',
+                'verbose_name_plural': 'Файлы картинок',
+            },
+        ),
+        # Хранилище на схему БД не влияет, а AlterField на SQLite
+        # пересобрал бы таблицу постов.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картиночка'),
+            ),
+        ]),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['image'], name='post_image_idx'),
+        ),
+        migrations.RunPython(fill_blobs, migrations.RunPython.noop),
+    ]
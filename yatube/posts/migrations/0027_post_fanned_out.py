@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+from posts.search import without_triggers
+
+
+def mark_unfanned(apps, schema_editor):
+    # Посты популярных авторов раньше не раскладывались по Timeline,
+    # а уже разложенные до пересечения порога теперь подтягиваются.
+    Post = apps.get_model('posts', 'Post')
+    Timeline = apps.get_model('posts', 'Timeline')
+    Post.objects.filter(
+        author__profile__followers_count__gt=getattr(
+            settings, 'FEED_FANOUT_THRESHOLD', 1000)
+    ).update(fanned_out=False)
+    Timeline.objects.filter(post__fanned_out=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0026_media_blob'),
+    ]
+
+    operations = without_triggers(
+        migrations.AddField(
+            model_name='post',
+            name='fanned_out',
+            field=models.BooleanField(default=True, editable=False, verbose_name='разложен по лентам'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(fanned_out=False), fields=['author', '-created', '-id'], name='post_unfanned_idx'),
+        ),
+        migrations.RunPython(mark_unfanned, migrations.RunPython.noop),
+    )
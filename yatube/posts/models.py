@@ -2,6 +2,8 @@ from django.db import models
 from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 
+from posts.storage import content_storage
+
 User = get_user_model()
 
 
@@ -19,13 +21,52 @@ class Post(CreatedModel):
         on_delete=models.SET_NULL,
         verbose_name='группа',
         help_text='Группа, к которой будет относиться пост')
-    image = models.ImageField('Картиночка', upload_to='posts/', blank=True)
+    image = models.ImageField(
+        'Картиночка', upload_to='posts/', blank=True, storage=content_storage)
+    # Метаданные картинки, их заполняет posts.images при загрузке.
+    image_width = models.PositiveIntegerField(
+        'ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'высота картинки', null=True, editable=False)
+    image_format = models.CharField(
+        'формат картинки', max_length=10, blank=True, editable=False)
+    image_size = models.PositiveIntegerField(
+        'размер картинки в байтах', null=True, editable=False)
+    image_color = models.CharField(
+        'основной цвет картинки', max_length=7, blank=True, editable=False)
+    image_placeholder = models.TextField(
+        'размытая миниатюра', blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'число комментариев', default=0, editable=False)
+    # False — автор был популярным при публикации, и пост не разложен
+    # по Timeline подписчиков: лента подписок подтягивает его при чтении.
+    fanned_out = models.BooleanField(
+        'разложен по лентам', default=True, editable=False)
+    updated = models.DateTimeField('дата изменения', auto_now=True)
 
     class Meta:
         ordering = ('-created', )
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         default_related_name = 'posts'
+        indexes = (
+            models.Index(
+                fields=('-created', '-id'), name='post_created_idx'),
+            models.Index(
+                fields=('author', '-created', '-id'),
+                name='post_author_created_idx'
+            ),
+            models.Index(
+                fields=('group', '-created', '-id'),
+                name='post_group_created_idx'
+            ),
+            models.Index(fields=('image',), name='post_image_idx'),
+            models.Index(
+                fields=('author', '-created', '-id'),
+                name='post_unfanned_idx',
+                condition=models.Q(fanned_out=False)
+            ),
+        )
 
     def __str__(post):
         return post.text[:15]
@@ -55,6 +96,12 @@ class Comment(CreatedModel):
         default_related_name = 'comments'
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', '-created', '-id'),
+                name='comment_post_created_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -74,8 +121,89 @@ class Follow(models.Model):
         constraints = (
             models.UniqueConstraint(
                 fields=("author", "user"), name="unique_follower_following"
-            )
+            ),
+        )
+        # Путь (author, user) уже покрыт индексом уникального ограничения.
+        indexes = (
+            models.Index(
+                fields=('user', 'author'), name='follow_user_author_idx'),
         )
 
     def __str__(self):
         return f"{self.user.username} подписан на {self.author.username}"
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: строка на пост для каждого
+    подписчика автора. Заполняется при публикации поста и подписке."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, verbose_name='Пост'
+    )
+    created = models.DateTimeField('дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        default_related_name = 'timeline'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_timeline_post'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-created', '-post'),
+                name='timeline_user_created_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post_id} в ленте {self.user_id}'
+
+
+class Profile(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами при создании и удалении постов и подписок,
+    расхождения исправляет команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name='profile',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField('число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'число подписчиков', default=0)
+    following_count = models.PositiveIntegerField('число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+        indexes = (
+            models.Index(
+                fields=('followers_count',), name='profile_followers_idx'),
+        )
+
+    def __str__(self):
+        return f'Профиль {self.user_id}'
+
+
+class MediaBlob(models.Model):
+    """Файл картинки в хранилище и число постов, которые на него ссылаются.
+
+    Поддерживается сигналами при сохранении и удалении постов,
+    расхождения исправляет команда reconcile_counters.
+    """
+    name = models.CharField('путь в хранилище', max_length=100, unique=True)
+    refcount = models.PositiveIntegerField('число ссылок', default=0)
+    updated = models.DateTimeField('дата изменения', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Файл картинки'
+        verbose_name_plural = 'Файлы картинок'
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
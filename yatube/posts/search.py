@@ -0,0 +1,214 @@
+"""Полнотекстовый поиск постов по индексу SQLite FTS5.
+
+Индекс posts_post_fts (текст поста, название группы и имя автора)
+создаёт миграция 0024_post_search, в актуальном состоянии его держат
+триггеры. Результаты ранжируются по BM25 и листаются курсором по паре
+(ранг, id), поэтому каждая страница — один запрос к индексу.
+"""
+import base64
+import binascii
+
+from django.db import connection, migrations, transaction
+
+from posts.utils import POSTS_PER_PAGE
+
+AUTHOR_NAME_SQL = (
+    "SELECT first_name || ' ' || last_name || ' ' || username "
+    'FROM auth_user WHERE id = new.author_id'
+)
+INDEX_POST_SQL = f"""
+    INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+    SELECT new.id, new.text,
+        (SELECT title FROM posts_group WHERE id = new.group_id),
+        ({AUTHOR_NAME_SQL});
+"""
+# Триггеры индекса: те же, что создала 0024_post_search.
+TRIGGERS = {
+    'posts_post_fts_insert': f"""
+        AFTER INSERT ON posts_post BEGIN {INDEX_POST_SQL} END
+    """,
+    'posts_post_fts_update': f"""
+        AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN
+            DELETE FROM posts_post_fts WHERE rowid = old.id;
+            {INDEX_POST_SQL}
+        END
+    """,
+    'posts_post_fts_delete': """
+        AFTER DELETE ON posts_post BEGIN
+            DELETE FROM posts_post_fts WHERE rowid = old.id;
+        END
+    """,
+    'posts_group_fts_update': """
+        AFTER UPDATE OF title ON posts_group BEGIN
+            UPDATE posts_post_fts SET group_title = new.title
+            WHERE rowid IN (
+                SELECT id FROM posts_post WHERE group_id = new.id);
+        END
+    """,
+    'auth_user_fts_update': """
+        AFTER UPDATE OF first_name, last_name, username ON auth_user BEGIN
+            UPDATE posts_post_fts
+            SET author_name = new.first_name || ' ' || new.last_name || ' '
+                || new.username
+            WHERE rowid IN (
+                SELECT id FROM posts_post WHERE author_id = new.id);
+        END
+    """,
+}
+
+# Вес совпадений в тексте, названии группы и имени автора для bm25().
+WEIGHTS = (1.0, 0.5, 0.5)
+RANK_SQL = 'bm25(posts_post_fts, {}, {}, {})'.format(*WEIGHTS)
+
+REBUILD_SQL = (
+    'DELETE FROM posts_post_fts',
+    """
+    INSERT INTO posts_post_fts (rowid, text, group_title, author_name)
+    SELECT posts_post.id, posts_post.text, posts_group.title,
+        auth_user.first_name || ' ' || auth_user.last_name || ' '
+        || auth_user.username
+    FROM posts_post
+    INNER JOIN auth_user ON auth_user.id = posts_post.author_id
+    LEFT JOIN posts_group ON posts_group.id = posts_post.group_id
+    """,
+    "INSERT INTO posts_post_fts (posts_post_fts) VALUES ('optimize')",
+)
+
+
+def match_expression(query):
+    """Строка запроса в выражение MATCH: все слова, без синтаксиса FTS5.
+
+    Каждое слово берётся в кавычки, поэтому кавычки, звёздочки и
+    операторы из пользовательского ввода не ломают запрос.
+    """
+    words = [word.replace('"', '""') for word in query.split()]
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def encode_rank_cursor(rank, pk):
+    raw = f'{rank!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_rank_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        rank, pk = raw.decode().split('|')
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def ranked_ids(match, position=None, limit=POSTS_PER_PAGE):
+    """До limit пар (ранг, id) после позиции, лучшие совпадения первыми."""
+    sql = (
+        f'SELECT {RANK_SQL}, rowid FROM posts_post_fts '
+        'WHERE posts_post_fts MATCH %s'
+    )
+    params = [match]
+    if position is not None:
+        sql += f' AND ({RANK_SQL} > %s OR ({RANK_SQL} = %s AND rowid > %s))'
+        rank, pk = position
+        params += [rank, rank, pk]
+    sql += f' ORDER BY {RANK_SQL}, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def matching_ids_sql(match):
+    """Подзапрос с id всех найденных постов для фильтра pk__in."""
+    return (
+        'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+        [match]
+    )
+
+
+class SearchPage:
+    """Страница результатов: посты в порядке ранга и курсор дальше."""
+
+    def __init__(self, posts, next_cursor):
+        self.object_list = posts
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def search_posts(posts, query, after=None, per_page=POSTS_PER_PAGE):
+    """Страница постов из posts, подходящих под query, по убыванию BM25.
+
+    posts — QuerySet постов, из которого берутся найденные строки
+    (с нужными select_related); битый курсор открывает первую страницу.
+    """
+    match = match_expression(query)
+    if not match:
+        return SearchPage([], None)
+    position = decode_rank_cursor(after) if after else None
+    rows = ranked_ids(match, position, per_page + 1)
+    found = posts.in_bulk([pk for _, pk in rows[:per_page]])
+    page = [found[pk] for _, pk in rows[:per_page] if pk in found]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_rank_cursor(*rows[per_page - 1])
+    return SearchPage(page, next_cursor)
+
+
+def rebuild_index():
+    """Перестраивает индекс заново по текущим постам."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+def has_index(db):
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'posts_post_fts'")
+        return cursor.fetchone() is not None
+
+
+def create_triggers(db):
+    """Создаёт недостающие триггеры индекса в БД db."""
+    if not has_index(db):
+        return
+    with db.cursor() as cursor:
+        for name, body in TRIGGERS.items():
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {body}')
+
+
+def drop_triggers(db):
+    if not has_index(db):
+        return
+    with db.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+
+def without_triggers(*operations):
+    """Операции миграции, между которыми триггеры индекса сняты.
+
+    SQLite меняет схему posts_post пересборкой таблицы, а триггеры
+    на posts_group и auth_user ссылаются на неё и ломают пересборку.
+    Миграции, меняющие posts_post, оборачивают в это свои операции.
+    """
+    def create(apps, schema_editor):
+        create_triggers(schema_editor.connection)
+
+    def drop(apps, schema_editor):
+        drop_triggers(schema_editor.connection)
+
+    return [
+        migrations.RunPython(drop, create),
+        *operations,
+        migrations.RunPython(create, drop),
+    ]
@@ -0,0 +1,121 @@
+"""Хранилище картинок постов с именами по содержимому.
+
+Файл называется по SHA-256 своих байтов и лежит в подпапках по первым
+байтам хеша (posts/ab/cd/abcd….jpg), чтобы ни в одной папке не
+скапливались сотни тысяч файлов. Одинаковые загрузки
+(перепощенные мемы) ложатся в один файл, а sorl-thumbnail, который
+ключует миниатюры по имени исходника, создаёт для них один набор
+миниатюр. Сколько постов ссылается на файл, считает MediaBlob.refcount;
+файлы без ссылок удаляет команда collect_media_garbage.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import shutil
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+# Уровни подпапок и число символов хеша в имени каждой.
+SHARD_LEVELS = 2
+SHARD_WIDTH = 2
+SHARDED_NAME = (
+    r'^([^/]+/)*' + r'[0-9a-f]{%d}/' % SHARD_WIDTH * SHARD_LEVELS
+    + r'[0-9a-f]{64}(\.[^./]+)?$'
+)
+
+
+def shard_path(digest):
+    """Подпапки для файла с хешем digest: 'ab/cd'."""
+    return '/'.join(
+        digest[level * SHARD_WIDTH:(level + 1) * SHARD_WIDTH]
+        for level in range(SHARD_LEVELS)
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, где имя файла — хеш его содержимого."""
+
+    def content_name(self, name, content):
+        """Имя по содержимому в подпапках той же папки, расширение то же."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        if re.match(SHARDED_NAME, name):
+            directory = directory.rsplit('/', SHARD_LEVELS)[0]
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, shard_path(digest), digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        # Такой файл уже есть: второй раз те же байты не пишутся.
+        try:
+            self.touch(name)
+        except FileNotFoundError:
+            return super().save(name, content, max_length=max_length)
+        return name
+
+    def touch(self, name):
+        """Отмечает существующий файл как только что использованный.
+
+        Иначе сборщик мусора удалил бы файл без ссылок, загруженный
+        повторно, до того как сохранится ссылающийся на него пост.
+        """
+        os.utime(self.path(name))
+        apps.get_model('posts', 'MediaBlob').objects.filter(
+            name=name).update(updated=timezone.now())
+
+    def walk(self, directory):
+        """Имена всех файлов в directory и вложенных папках, по одному.
+
+        В отличие от listdir, не собирает список папки целиком.
+        """
+        pending = [directory.rstrip('/')]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = os.scandir(self.path(current))
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = f'{current}/{entry.name}'
+                    if entry.is_dir():
+                        pending.append(name)
+                    else:
+                        yield name
+
+
+content_storage = ContentAddressedStorage()
+
+
+def shard_file(name):
+    """Копия файла name под именем по содержимому, новое имя или None.
+
+    Копия делается жёсткой ссылкой, если это возможно; исходный файл
+    остаётся на месте, пока на него ссылаются посты. None — если
+    исходного файла нет.
+    """
+    try:
+        with content_storage.open(name) as file:
+            target = content_storage.content_name(name, file)
+    except FileNotFoundError:
+        return None
+    if target != name and not content_storage.exists(target):
+        source, path = content_storage.path(name), content_storage.path(target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+    return target
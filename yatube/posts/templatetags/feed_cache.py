@@ -0,0 +1,22 @@
+from django import template
+
+from posts.cache import cache_timeout, get_generations
+
+register = template.Library()
+
+
+@register.simple_tag
+def feed_generation(*parts):
+    """Поколение ленты для ключа {% cache %}.
+
+    Имя ленты собирается из частей: {% feed_generation 'group' group.pk %}
+    даёт поколение ленты group:<pk>.
+    """
+    feed = ':'.join(map(str, parts))
+    return get_generations(feed)[0]
+
+
+@register.filter(name='cache_timeout')
+def fragment_timeout(timeout):
+    """Срок {% cache %}, укороченный для кэша в памяти процесса."""
+    return cache_timeout(int(timeout))
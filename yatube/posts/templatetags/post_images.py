@@ -0,0 +1,52 @@
+from django import template
+from PIL import Image
+
+from posts.thumbnails import (
+    prefetch_thumbnails, ready_thumbnail, ready_variants, sizes
+)
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post, rendition):
+    """Готовая миниатюра картинки поста или None, пока она генерируется."""
+    return ready_thumbnail(post, rendition)
+
+
+@register.simple_tag
+def prefetch_post_thumbnails(posts, rendition):
+    """Готовые миниатюры всех постов страницы одним чтением метаданных."""
+    prefetch_thumbnails(posts, rendition)
+    return ''
+
+
+@register.inclusion_tag('includes/post_image.html')
+def post_picture(post, rendition, css_class='', css_style=''):
+    """Картинка поста с srcset из готовых вариантов и ленивой загрузкой.
+
+    Варианты в WebP выводятся в <source>, обычные — в srcset у <img>;
+    варианты одной фактической ширины (маленькая картинка, которую
+    не увеличивают) попадают в srcset один раз.
+    """
+    by_format = {}
+    for image_format, thumbnail in ready_variants(post, rendition):
+        by_format.setdefault(image_format, {}).setdefault(
+            thumbnail.width, thumbnail.url)
+    srcsets = {
+        image_format: ', '.join(
+            f'{url} {width}w' for width, url in sorted(urls.items()))
+        for image_format, urls in by_format.items()
+    }
+    return {
+        'post': post,
+        'im': ready_thumbnail(post, rendition),
+        'srcset': srcsets.pop(None, ''),
+        'sources': [
+            {'type': Image.MIME[image_format], 'srcset': srcset}
+            for image_format, srcset in srcsets.items()
+        ],
+        'sizes': sizes(rendition),
+        'css_class': css_class,
+        'css_style': css_style,
+    }
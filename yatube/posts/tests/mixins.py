@@ -0,0 +1,31 @@
+import shutil
+
+from django.test import override_settings
+
+from posts.tests.constants import TEMP_MEDIA_ROOT
+
+
+class TempMediaMixin:
+    """Файлы тестов класса пишутся во временную MEDIA_ROOT.
+
+    Подмешивается перед TestCase: настройка действует уже в
+    setUpTestData, а папка удаляется после всех тестов класса.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_settings = override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+        cls.media_settings.enable()
+        try:
+            super().setUpClass()
+        except Exception:
+            cls.media_settings.disable()
+            raise
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            cls.media_settings.disable()
+            shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.http import Http404
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from posts.cache import get_generations
+from posts.comment_buffer import (
+    CommentBuffer, CommentNotSaved, PendingComment, comment_buffer
+)
+from posts.models import Comment, Post, User
+
+AUTHOR = 'commenter'
+
+
+class CommentBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR)
+        cls.post = Post.objects.create(author=cls.user, text='Эфир')
+
+    def pending(self, text, post_id=None):
+        return PendingComment(Comment(
+            author=self.user, post_id=post_id or self.post.pk, text=text))
+
+    def test_write_batch(self):
+        """Пачка пишется по порядку, счётчик и поколение обновляются."""
+        generation = get_generations(f'post:{self.post.pk}')[0]
+        batch = [self.pending(f'Комментарий {i}') for i in range(3)]
+        missing = self.pending('В пустоту', post_id=self.post.pk + 100)
+        batch.insert(1, missing)
+        with self.assertNumQueries(5):
+            CommentBuffer().write(batch)
+        self.assertEqual(
+            list(self.post.comments.order_by('id').values_list(
+                'text', flat=True)),
+            [f'Комментарий {i}' for i in range(3)]
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 3)
+        self.assertNotEqual(
+            get_generations(f'post:{self.post.pk}')[0], generation)
+        self.assertIsNone(batch[0].error)
+        self.assertIsInstance(missing.error, Http404)
+        with self.assertRaises(Http404):
+            missing.wait(0)
+
+    def test_write_error(self):
+        """При ошибке записи каждая вью пачки получает своё исключение."""
+        batch = [self.pending('Ок'), self.pending(None)]
+        CommentBuffer().write(batch)
+        self.assertFalse(Comment.objects.exists())
+        first, second = (pending.error for pending in batch)
+        self.assertIsInstance(first, CommentNotSaved)
+        self.assertIsNot(first, second)
+        self.assertIs(first.__cause__, second.__cause__)
+
+    def test_timeout_cancels(self):
+        """Не дождавшийся писателя комментарий убирается из очереди."""
+        buffer = CommentBuffer()
+        expired, waiting = self.pending('Поздно'), self.pending('Вовремя')
+        buffer.queue.put(expired)
+        buffer.queue.put(waiting)
+        with self.assertRaises(CommentNotSaved):
+            expired.wait(0)
+        self.assertEqual(buffer.next_batch(), [waiting])
+
+    @override_settings(COMMENT_BUFFER_BATCH=2)
+    def test_next_batch(self):
+        """Писатель забирает накопленное, но не больше COMMENT_BUFFER_BATCH."""
+        buffer = CommentBuffer()
+        items = [self.pending(str(i)) for i in range(3)]
+        for item in items:
+            buffer.queue.put(item)
+        buffer.queue.put(None)
+        self.assertEqual(buffer.next_batch(), items[:2])
+        self.assertEqual(buffer.next_batch(), items[2:])
+        self.assertIsNone(buffer.next_batch())
+
+
+@override_settings(COMMENT_BUFFER=True)
+class BufferedCommentViewTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=AUTHOR)
+        self.post = Post.objects.create(author=self.user, text='Эфир')
+        self.client.force_login(self.user)
+        self.addCleanup(comment_buffer.stop)
+
+    def test_add_comment(self):
+        """Комментарий через буфер записан к моменту ответа вью."""
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        for text in ('Первый', 'Второй'):
+            response = self.client.post(url, {'text': text})
+            self.assertRedirects(
+                response,
+                reverse('posts:post_detail', args=[self.post.pk]),
+                fetch_redirect_response=False
+            )
+        self.assertEqual(
+            list(self.post.comments.order_by('id').values_list(
+                'text', flat=True)),
+            ['Первый', 'Второй']
+        )
+
+    @override_settings(COMMENT_BUFFER_TIMEOUT=0)
+    def test_timeout_retry(self):
+        """Не записанный вовремя комментарий — 503, его можно повторить."""
+        url = reverse('posts:add_comment', args=[self.post.pk])
+        with mock.patch.object(comment_buffer, 'start'):
+            response = self.client.post(url, {'text': 'Повтор'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        comment_buffer.queue.put(None)
+        self.assertIsNone(comment_buffer.next_batch())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_missing_post(self):
+        """Комментарий к несуществующему посту — 404."""
+        url = reverse('posts:add_comment', args=[self.post.pk + 100])
+        response = self.client.post(url, {'text': 'В пустоту'})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.exists())
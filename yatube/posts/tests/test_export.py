@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Comment, Group, Post, User
+from posts.tests.constants import SMALL_GIF
+from posts.tests.mixins import TempMediaMixin
+
+AUTHOR = 'exporter'
+STRANGER = 'stranger'
+EXPORT = reverse('posts:profile_export', args=[AUTHOR])
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class ExportTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=AUTHOR)
+        cls.other = User.objects.create_user(username=STRANGER)
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост с картинкой', group=group,
+            image=SimpleUploadedFile(
+                'cat.gif', SMALL_GIF, content_type='image/gif')
+        )
+        Post.objects.create(author=cls.author, text='Пост, "с запятой"')
+        foreign = Post.objects.create(author=cls.other, text='Чужой пост')
+        Comment.objects.create(
+            post=foreign, author=cls.author, text='Комментарий')
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ndjson(self):
+        """NDJSON: посты, затем комментарии, по строке на запись."""
+        response = self.client.get(EXPORT)
+        self.assertEqual(response['Content-Type'],
+                         'application/x-ndjson; charset=utf-8')
+        self.assertIn(f'{AUTHOR}-export.ndjson',
+                      response['Content-Disposition'])
+        rows = [
+            json.loads(line)
+            for line in self.content(response).decode().splitlines()
+        ]
+        self.assertEqual(
+            [row['type'] for row in rows], ['post', 'post', 'comment'])
+        self.assertEqual(rows[0]['group'], 'group')
+        self.assertEqual(rows[0]['image'], self.post.image.name)
+        self.assertEqual(rows[2]['post_author'], STRANGER)
+
+    def test_csv(self):
+        """CSV читается обратно с заголовком и экранированием."""
+        response = self.client.get(EXPORT, {'format': 'csv'})
+        rows = list(csv.DictReader(
+            io.StringIO(self.content(response).decode())))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1]['text'], 'Пост, "с запятой"')
+        self.assertEqual(rows[1]['group'], '')
+
+    def test_zip(self):
+        """Архив содержит выгрузку и картинки постов."""
+        response = self.client.get(EXPORT, {'zip': 1})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(self.content(response))) as archive:
+            self.assertEqual(
+                archive.namelist(), ['export.ndjson', self.post.image.name])
+            self.assertEqual(archive.read(self.post.image.name), SMALL_GIF)
+            self.assertEqual(
+                len(archive.read('export.ndjson').splitlines()), 3)
+
+    def test_forbidden(self):
+        """Чужую выгрузку получить нельзя."""
+        self.client.force_login(self.other)
+        response = self.client.get(EXPORT)
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        """Команда пишет ту же выгрузку в файл."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'export.csv')
+        call_command(
+            'export_posts', AUTHOR, format='csv', output=path,
+            stdout=StringIO())
+        with open(path, encoding='utf-8', newline='') as file:
+            self.assertEqual(len(list(csv.DictReader(file))), 3)
@@ -0,0 +1,81 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from posts.models import Group, Post, User
+
+AUTHOR = 'blogger'
+GROUP_SLUG = 'classic'
+
+
+@override_settings(FEED_ITEMS=3)
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=AUTHOR, first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Классика', slug=GROUP_SLUG, description='Книги')
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Глава {i}')
+            for i in range(5)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """Ленты отдают RSS и Atom не больше чем из FEED_ITEMS постов."""
+        urls = {
+            reverse('posts:index_rss'): 'application/rss+xml',
+            reverse('posts:index_atom'): 'application/atom+xml',
+            reverse('posts:group_rss', args=[GROUP_SLUG]):
+                'application/rss+xml',
+            reverse('posts:group_atom', args=[GROUP_SLUG]):
+                'application/atom+xml',
+            reverse('posts:profile_rss', args=[AUTHOR]):
+                'application/rss+xml',
+            reverse('posts:profile_atom', args=[AUTHOR]):
+                'application/atom+xml',
+        }
+        for url, content_type in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response['Content-Type'].startswith(
+                    content_type))
+                content = response.content.decode()
+                items = content.count('<item>') + content.count('<entry>')
+                self.assertEqual(items, 3)
+                self.assertIn('Глава', content)
+
+    def test_missing(self):
+        """Ленты несуществующих группы и автора — 404."""
+        for url in (
+            reverse('posts:group_rss', args=['nothing']),
+            reverse('posts:profile_atom', args=['nobody']),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_cached_until_new_post(self):
+        """Лента берётся из кэша, пока в ней не появится новый пост."""
+        url = reverse('posts:group_rss', args=[GROUP_SLUG])
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, first.content)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Эпилог')
+        fresh = self.client.get(url)
+        self.assertIn('Эпилог', fresh.content.decode())
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+
+    def test_conditional_get(self):
+        """Опрос с прежним ETag получает 304 без обращения к БД."""
+        url = reverse('posts:index_atom')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(author=self.author, text='Новое')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
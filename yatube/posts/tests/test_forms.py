@@ -49,7 +49,9 @@ class PostFormTests(TestCase):
         form_data = {
             'text': self.post.text,
             'group': self.group.id,
-            'image': self.uploaded
+            'image': SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif')
         }
         response = self.authorized_client.post(
             POST_CREATE, data=form_data, follow=True)
@@ -58,8 +60,11 @@ class PostFormTests(TestCase):
         self.assertEqual(post_create.text, form_data['text'])
         self.assertEqual(post_create.author, self.user)
         self.assertEqual(post_create.group.pk, form_data['group'])
-        data_image_name = 'posts/' + form_data['image'].name
-        self.assertEqual(post_create.image.name, data_image_name)
+        # Картинка перекодируется (GIF без прозрачности становится JPEG)
+        # и называется по хешу содержимого в подпапках по его началу.
+        self.assertRegex(
+            post_create.image.name,
+            r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
 
     def test_edit_post(self):
         """Редактирование записи создателем поста"""
@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts.models import Post, User
+from posts.tests.constants import INDEX, SMALL_GIF
+from posts.tests.mixins import TempMediaMixin
+
+AUTHOR = 'photographer'
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ImageMetadataTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR)
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF,
+                content_type='image/gif'
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_filled_on_upload(self):
+        """Метаданные считываются при загрузке картинки."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_format, 'GIF')
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/jpeg;base64,'))
+
+    def test_cleared_with_image(self):
+        """Без картинки метаданные пустые."""
+        post = Post.objects.create(author=self.user, text='Без картинки')
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_backfill(self):
+        """Команда заполняет метаданные у постов, загруженных раньше."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Старый пост',
+                 image=self.post.image.name),
+            Post(author=self.user, text='Потерянный файл',
+                 image='posts/missing.gif'),
+        ])
+        out = StringIO()
+        call_command('backfill_image_metadata', workers=0, stdout=out)
+        old = Post.objects.get(text='Старый пост')
+        broken = Post.objects.get(text='Потерянный файл')
+        self.assertEqual((old.image_width, old.image_height), (2, 1))
+        self.assertIsNone(broken.image_width)
+        self.assertIn('заполнены у 1 постов', out.getvalue())
+
+    def test_sized_image(self):
+        """В ленте картинка с размерами и цветом-заглушкой."""
+        response = self.client.get(INDEX)
+        self.assertContains(response, 'width="2" height="1"')
+        self.assertContains(response, self.post.image_color)
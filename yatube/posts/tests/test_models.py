@@ -1,5 +1,10 @@
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
-from posts.models import Group, Post, User
+from django.test.utils import CaptureQueriesContext
+from posts import counters
+from posts.counters import reconcile_profiles
+from posts.models import Comment, Follow, Group, Post, Profile, User
 from posts.tests.constants import USERNAME, SLUG
 
 
@@ -50,3 +55,60 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     Post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username='reader')
+
+    def assertCounters(self, user, **expected):
+        profile = Profile.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(profile, field), value)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ок')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertCounters(self.author, posts_count=1, followers_count=1)
+        self.assertCounters(self.reader, following_count=1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        follow.delete()
+        post.comments.all().delete()
+        post.delete()
+        self.assertCounters(self.author, posts_count=0, followers_count=0)
+        self.assertCounters(self.reader, following_count=0)
+
+    def test_reconcile_counters(self):
+        """Расхождения после bulk_create исправляются пересчётом."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=str(i)) for i in range(3))
+        self.assertEqual(
+            reconcile_profiles(),
+            {'posts_count': 1, 'followers_count': 0, 'following_count': 0}
+        )
+        self.assertCounters(self.author, posts_count=3)
+        Profile.objects.all().delete()
+        call_command('reconcile_counters', stdout=open('/dev/null', 'w'))
+        self.assertCounters(self.author, posts_count=3)
+
+    def test_user_delete_cascade(self):
+        """Удаление пользователя не пересчитывает его профиль по строкам."""
+        for i in range(5):
+            Post.objects.create(author=self.author, text=str(i))
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        with CaptureQueriesContext(connection) as context:
+            self.author.delete()
+        recounts = [
+            query for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ]
+        self.assertEqual(recounts, [])
+        self.assertCounters(
+            self.reader, followers_count=0, following_count=0)
+        self.assertEqual(counters.deleting.ids, set())
@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post, User
+from posts.tests.constants import GROUP_LIST, INDEX, PROFILE, SLUG, USERNAME
+
+READER = 'reader'
+# Неразложенные посты всех подписок читаются одним запросом: по индексу
+# для каждого автора и с сортировкой найденного по времени.
+UNFANNED = '"posts_post"."fanned_out" = 0'
+UNFANNED_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+
+class QueryPlanTests(TestCase):
+    """Запросы вью идут по индексам: без полного просмотра таблиц
+    и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username=READER)
+        cls.group = Group.objects.create(title='Группа', slug=SLUG)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(12):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+        Comment.objects.create(post=post, author=cls.reader, text='Ок')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def tearDown(self):
+        cache.clear()
+
+    def assertIndexedPlans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            page_obj = self.client.get(url).context.get('page_obj')
+        if page_obj is not None and page_obj.has_next():
+            with CaptureQueriesContext(connection) as cursor_context:
+                self.client.get(url, {'after': page_obj.next_cursor})
+            queries = [*context.captured_queries,
+                       *cursor_context.captured_queries]
+        else:
+            queries = context.captured_queries
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for *_, detail in cursor.fetchall():
+                    with self.subTest(url=url, sql=sql, plan=detail):
+                        if UNFANNED in sql and detail == UNFANNED_SORT:
+                            continue
+                        self.assertNotIn('TEMP B-TREE', detail)
+                        self.assertFalse(
+                            detail.startswith('SCAN')
+                            and 'USING' not in detail
+                        )
+
+    def test_feed_plans(self):
+        """Ленты и страница поста читаются по индексам."""
+        urls = (
+            INDEX,
+            GROUP_LIST,
+            PROFILE,
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:post_comments', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            self.assertIndexedPlans(url)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_hybrid_follow_plans(self):
+        """Посты популярных авторов подтягиваются тоже по индексам."""
+        self.assertIndexedPlans(reverse('posts:follow_index'))
@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Group, Post, User
+from posts.search import TRIGGERS, ranked_ids, match_expression
+from posts.utils import POSTS_PER_PAGE
+
+SEARCH = reverse('posts:search')
+AUTHOR = 'leo'
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username=AUTHOR, first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title='Классика', slug='classic', description='Романы')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Война и мир')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'Черновик романа {i}')
+            for i in range(POSTS_PER_PAGE + 3)
+        )
+
+    def found(self, query):
+        response = self.client.get(SEARCH, {'q': query})
+        return list(response.context['results'])
+
+    def test_search_fields(self):
+        """Пост находится по тексту, группе и имени автора."""
+        for query in ('война', 'КЛАССИКА', 'Толстой мир'):
+            with self.subTest(query=query):
+                self.assertEqual(self.found(query), [self.post])
+
+    def test_ranking(self):
+        """Совпадение в тексте важнее совпадения в имени автора."""
+        other = User.objects.create_user(username='tolstoy_fan')
+        Post.objects.create(author=other, text='Толстой лучший')
+        self.assertEqual(self.found('Толстой')[0].author, other)
+
+    def test_triggers(self):
+        """Индекс следует за правкой, удалением и переименованиями."""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Анна Каренина'
+        post.save()
+        self.assertEqual(self.found('война'), [])
+        self.assertEqual(self.found('Каренина'), [post])
+        Group.objects.filter(pk=self.group.pk).update(title='Проза')
+        self.assertEqual(self.found('проза'), [post])
+        User.objects.filter(pk=self.author.pk).update(last_name='Т.')
+        self.assertEqual(self.found('Толстой'), [])
+        post.delete()
+        self.assertEqual(self.found('Каренина'), [])
+
+    def test_cursor(self):
+        """Результаты листаются курсором без повторов."""
+        first = self.client.get(
+            SEARCH, {'q': 'черновик'}).context['results']
+        self.assertEqual(len(first), POSTS_PER_PAGE)
+        self.assertTrue(first.has_next())
+        second = self.client.get(
+            SEARCH, {'q': 'черновик', 'after': first.next_cursor}
+        ).context['results']
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        self.assertTrue(set(first).isdisjoint(second))
+
+    def test_query_syntax(self):
+        """Синтаксис FTS5 во вводе не ломает поиск."""
+        for query in ('"', 'война AND', 'NEAR(', '*', 'text:мир', ''):
+            with self.subTest(query=query):
+                response = self.client.get(SEARCH, {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    def test_search_plan(self):
+        """Поиск идёт по индексу FTS5, а не просмотром таблицы постов."""
+        with CaptureQueriesContext(connection) as context:
+            ranked_ids(match_expression('война'), (-1.0, 1))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN QUERY PLAN {context.captured_queries[0]["sql"]}')
+            plan = [detail for *_, detail in cursor.fetchall()]
+        self.assertIn('VIRTUAL TABLE INDEX', plan[0])
+        self.assertNotIn('posts_post ', ' '.join(plan))
+
+    def test_rebuild(self):
+        """Команда перестраивает индекс с нуля."""
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_post_fts')
+        self.assertEqual(self.found('война'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('война'), [self.post])
+
+    def test_admin_search(self):
+        """В админке посты тоже ищутся по индексу."""
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'война'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post])
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            return {name for name, in cursor.fetchall()}
+
+    def test_triggers_after_migrate(self):
+        """migrate восстанавливает снятые триггеры индекса."""
+        self.assertLessEqual(set(TRIGGERS), self.triggers())
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        call_command('migrate', verbosity=0)
+        self.assertLessEqual(set(TRIGGERS), self.triggers())
+        Post.objects.create(author=self.author, text='Анна Каренина')
+        self.assertEqual(len(self.found('Каренина')), 1)
@@ -0,0 +1,142 @@
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from posts import thumbnails
+from posts.counters import reconcile_blobs
+from posts.models import MediaBlob, Post, User
+from posts.storage import SHARDED_NAME
+from posts.tests.constants import SMALL_GIF
+from posts.tests.mixins import TempMediaMixin
+
+AUTHOR = 'reposter'
+
+
+def upload(name, content=SMALL_GIF):
+    return SimpleUploadedFile(name, content, content_type='image/gif')
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ContentStorageTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR)
+
+    def refcount(self, name):
+        return MediaBlob.objects.get(name=name).refcount
+
+    def test_identical_uploads_shared(self):
+        """Одинаковые загрузки ложатся в один файл с одними миниатюрами."""
+        first = Post.objects.create(
+            author=self.user, text='Мем', image=upload('meme.gif'))
+        second = Post.objects.create(
+            author=self.user, text='Репост', image=upload('copy.gif'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+        thumbnails.generate(first.image.name)
+        self.assertEqual(
+            thumbnails.ready_thumbnail(first, 'card').name,
+            thumbnails.ready_thumbnail(second, 'card').name
+        )
+
+    def test_refcount(self):
+        """Число ссылок следует за сменой картинки и удалением поста."""
+        post = Post.objects.create(
+            author=self.user, text='Мем', image=upload('meme.gif'))
+        old = post.image.name
+        post.image = upload('other.gif', SMALL_GIF + b'\0')
+        post.save()
+        self.assertEqual(self.refcount(old), 0)
+        self.assertEqual(self.refcount(post.image.name), 1)
+        post.delete()
+        self.assertEqual(self.refcount(post.image.name), 0)
+
+    def test_reconcile(self):
+        """Ссылки постов из bulk_create учитываются при сверке."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}', image='posts/bulk.gif')
+            for i in range(3)
+        )
+        self.assertEqual(reconcile_blobs(), {'refcount': 1})
+        self.assertEqual(self.refcount('posts/bulk.gif'), 3)
+
+    def test_garbage_collection(self):
+        """Сборщик удаляет файлы без ссылок и не трогает используемые."""
+        kept = Post.objects.create(
+            author=self.user, text='Мем', image=upload('meme.gif'))
+        dropped = Post.objects.create(
+            author=self.user, text='Удалю',
+            image=upload('drop.gif', SMALL_GIF + b'\1'))
+        thumbnails.generate(dropped.image.name)
+        card = thumbnails.ready_thumbnail(dropped, 'card')
+        dropped.delete()
+        call_command('collect_media_garbage', grace=0, stdout=StringIO())
+        self.assertTrue(kept.image.storage.exists(kept.image.name))
+        self.assertFalse(kept.image.storage.exists(dropped.image.name))
+        self.assertFalse(os.path.exists(card.storage.path(card.name)))
+        self.assertFalse(
+            MediaBlob.objects.filter(name=dropped.image.name).exists())
+
+    def test_garbage_grace(self):
+        """Недавно освободившиеся файлы переживают сборку."""
+        post = Post.objects.create(
+            author=self.user, text='Мем', image=upload('meme.gif'))
+        name = post.image.name
+        post.delete()
+        out = StringIO()
+        call_command('collect_media_garbage', stdout=out)
+        self.assertTrue(post.image.storage.exists(name))
+        self.assertIn('удалено: 0', out.getvalue())
+
+    def test_garbage_reupload(self):
+        """Повторная загрузка файла без ссылок защищает его от сборки."""
+        post = Post.objects.create(
+            author=self.user, text='Мем', image=upload('meme.gif'))
+        name = post.image.name
+        post.delete()
+        old = time.time() - 2 * 60 * 60
+        os.utime(post.image.storage.path(name), (old, old))
+        MediaBlob.objects.filter(name=name).update(
+            updated=timezone.now() - timedelta(hours=2))
+        self.assertEqual(
+            post.image.storage.save('posts/again.gif', upload('again.gif')),
+            name
+        )
+        call_command('collect_media_garbage', stdout=StringIO())
+        self.assertTrue(post.image.storage.exists(name))
+
+    def test_shard_media(self):
+        """Перенос раскладывает файлы по подпапкам, повторный — ничего."""
+        flat = FileSystemStorage()
+        names = [
+            flat.save('posts/old.gif', ContentFile(SMALL_GIF)),
+            flat.save('posts/same.gif', ContentFile(SMALL_GIF)),
+            flat.save('posts/other.gif', ContentFile(SMALL_GIF + b'\0')),
+        ]
+        Post.objects.bulk_create(
+            Post(author=self.user, text=name, image=name) for name in names)
+        Post.objects.create(
+            author=self.user, text='Потерян', image='posts/lost.gif')
+        out = StringIO()
+        call_command('shard_media', workers=0, batch=2, stdout=out)
+        self.assertIn('Перенесено файлов: 3, не найдено: 1', out.getvalue())
+        moved = dict(Post.objects.filter(
+            text__in=names).values_list('text', 'image'))
+        self.assertEqual(moved['posts/old.gif'], moved['posts/same.gif'])
+        for old, new in moved.items():
+            with self.subTest(old=old):
+                self.assertRegex(new, SHARDED_NAME)
+                self.assertTrue(flat.exists(new))
+                self.assertFalse(flat.exists(old))
+        self.assertEqual(self.refcount(moved['posts/old.gif']), 2)
+        self.assertFalse(MediaBlob.objects.filter(name__in=names).exists())
+        out = StringIO()
+        call_command('shard_media', workers=0, stdout=out)
+        self.assertIn('Перенесено файлов: 0, не найдено: 1', out.getvalue())
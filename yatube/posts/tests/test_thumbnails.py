@@ -0,0 +1,151 @@
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import thumbnails
+from posts.cache import get_generations
+from posts.models import Post, User
+from posts.tests.constants import INDEX, SMALL_GIF
+from posts.tests.mixins import TempMediaMixin
+
+AUTHOR = 'painter'
+
+
+@override_settings(THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR)
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='pending.gif', content=SMALL_GIF,
+                content_type='image/gif'
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        # Свежий экземпляр: подгруженные миниатюры не переходят между тестами.
+        self.post = Post.objects.get(pk=self.post.pk)
+
+    def test_fallback_while_pending(self):
+        """Пока миниатюры нет, показывается исходная картинка."""
+        response = self.client.get(INDEX)
+        self.assertContains(response, self.post.image.url)
+        thumbnails.schedule(self.post)
+        response = self.client.get(INDEX)
+        self.assertNotContains(response, self.post.image.url)
+        card = thumbnails.ready_thumbnail(self.post, 'card')
+        self.assertContains(response, card.url)
+
+    def test_renditions(self):
+        """Карточка увеличивается до 400px, страница поста — нет."""
+        thumbnails.generate(self.post.image.name)
+        card = thumbnails.ready_thumbnail(self.post, 'card')
+        detail = thumbnails.ready_thumbnail(self.post, 'detail')
+        self.assertEqual(card.x, 400)
+        self.assertEqual(detail.size, [2, 1])
+
+    def test_schedule_once(self):
+        """Одну картинку не ставят в очередь дважды."""
+        cache.add(thumbnails.pending_key(self.post.image.name), True)
+        thumbnails.schedule(self.post)
+        self.assertIsNone(thumbnails.ready_thumbnail(self.post, 'card'))
+
+    def test_broken_pool_fallback(self):
+        """Сломанный пул забывается, миниатюры создаются в процессе."""
+        broken = ProcessPoolExecutor(max_workers=1)
+        broken.shutdown()
+        thumbnails._executor = broken
+        with mock.patch.object(thumbnails, 'in_process', return_value=False):
+            thumbnails.schedule(self.post)
+        self.assertIsNone(thumbnails._executor)
+        self.assertIsNone(cache.get(thumbnails.pending_key(
+            self.post.image.name)))
+        self.assertIsNotNone(thumbnails.ready_thumbnail(self.post, 'card'))
+
+    def test_page_lookup_batched(self):
+        """Метаданные миниатюр страницы читаются одним запросом."""
+        posts = Post.objects.bulk_create(
+            Post(author=self.user, text=f'Ещё картинка {i}',
+                 image=self.post.image.name)
+            for i in range(5)
+        )
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(INDEX)
+        lookups = [
+            query for query in context.captured_queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(thumbnails.thumbnail_stats(), {
+            'batch_lookups': 1,
+            'batched_posts': len(posts) + 1,
+            'single_lookups': 0,
+        })
+        card = thumbnails.ready_thumbnail(self.post, 'card')
+        self.assertContains(
+            response, f'src="{card.url}"', count=len(posts) + 1)
+
+    def test_detail_lookup_single(self):
+        """Страница поста не считается пакетным чтением миниатюр."""
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertEqual(thumbnails.thumbnail_stats(), {
+            'batch_lookups': 0,
+            'batched_posts': 0,
+            'single_lookups': 1,
+        })
+
+    def test_srcset(self):
+        """Карточка выводит srcset из вариантов разной ширины."""
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(INDEX)
+        widths = [
+            thumbnail.width for image_format, thumbnail
+            in thumbnails.ready_variants(self.post, 'card')
+            if image_format is None
+        ]
+        self.assertEqual(widths, [160, 240, 400])
+        for image_format, thumbnail in thumbnails.ready_variants(
+                self.post, 'card'):
+            self.assertContains(
+                response, f'{thumbnail.url} {thumbnail.width}w')
+        self.assertContains(response, 'sizes="30vw"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_savings_report(self):
+        """Отчёт сравнивает основной размер с выбранным вариантом."""
+        thumbnails.generate(self.post.image.name)
+        out = StringIO()
+        call_command('responsive_savings', stdout=out)
+        self.assertRegex(out.getvalue(), r'card\s+телефон\s+\d+ КБ')
+
+    def test_generate_command(self):
+        """Команда работает без пула и сбрасывает кэш лент поста."""
+        feeds = ('index', f'author:{self.user.pk}', f'post:{self.post.pk}')
+        before = get_generations(*feeds)
+        out = StringIO()
+        call_command('generate_thumbnails', stdout=out)
+        self.assertIn('Миниатюры созданы для 1 картинок', out.getvalue())
+        for old, new in zip(before, get_generations(*feeds)):
+            self.assertNotEqual(old, new)
+
+    def test_sizes(self):
+        """Атрибут sizes собирается из долей ширины окна."""
+        self.assertEqual(
+            thumbnails.sizes('detail'), '(min-width: 768px) 75vw, 100vw')
@@ -0,0 +1,93 @@
+import io
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+from posts.forms import PostForm
+from posts.images import EXIF_ORIENTATION
+from posts.models import Post, User
+from posts.tests.constants import POST_CREATE
+from posts.tests.mixins import TempMediaMixin
+
+AUTHOR = 'uploader'
+
+
+def image_file(name, size, mode='RGB', image_format='JPEG', color='red',
+               **options):
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(THUMBNAIL_WORKERS=0, POST_IMAGE_MAX_EDGE=100)
+class UploadTests(TempMediaMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=AUTHOR)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def processed(self, upload):
+        form = PostForm({'text': 'Картинка'}, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    def test_longest_edge(self):
+        """Длинная сторона уменьшается до POST_IMAGE_MAX_EDGE."""
+        image = self.processed(image_file('wide.jpg', (400, 200)))
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(image.format, 'JPEG')
+
+    def test_exif_orientation(self):
+        """Поворот из EXIF применяется, сам EXIF не сохраняется."""
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = 6
+        image = self.processed(
+            image_file('phone.jpg', (80, 40), exif=exif.tobytes()))
+        self.assertEqual(image.size, (40, 80))
+        self.assertNotIn('exif', image.info)
+
+    def test_transparency_kept(self):
+        """Картинка с прозрачностью сохраняется в PNG, без неё — в JPEG."""
+        transparent = self.processed(image_file(
+            'logo.png', (10, 10), 'RGBA', 'PNG', (255, 0, 0, 128)))
+        self.assertEqual(transparent.format, 'PNG')
+        opaque = self.processed(image_file(
+            'opaque.png', (10, 10), 'RGBA', 'PNG', (255, 0, 0, 255)))
+        self.assertEqual(opaque.format, 'JPEG')
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_pixel_limit(self):
+        """Картинка с лишними пикселями отклоняется до декодирования."""
+        form = PostForm(
+            {'text': 'Картинка'}, {'image': image_file('big.jpg', (20, 20))})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'too_many_pixels')
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_size_limit(self):
+        """Слишком большой файл не сохраняется, форма сообщает о размере."""
+        upload = image_file('noise.png', (64, 64), 'RGB', 'PNG')
+        upload = SimpleUploadedFile(
+            'noise.png', upload.read() + b'\0' * 2048)
+        response = self.client.post(
+            POST_CREATE, {'text': 'Большой файл', 'image': upload})
+        form = response.context['form']
+        self.assertEqual(form.errors.as_data()['image'][0].code, 'too_large')
+        self.assertEqual(form.oversized_image.size, upload.size)
+        self.assertIsNone(form.oversized_image.file)
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+
+    def test_limit_only_post_forms(self):
+        """Ограничитель стоит только во вью форм постов, CSRF проверяется."""
+        self.assertNotIn(
+            'posts.uploads.LimitedUploadHandler',
+            settings.FILE_UPLOAD_HANDLERS
+        )
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(POST_CREATE, {'text': 'Без токена'})
+        self.assertEqual(response.status_code, 403)
@@ -1,10 +1,17 @@
+import os
 import shutil
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
 from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django import forms
-from posts.models import Group, Post, Follow, User
+from posts.cache import PAGE_CACHE_VIEWS, get_generations, page_cache_stats
+from posts.models import Comment, Group, Post, Follow, Timeline, User
 from posts.tests.constants import (
     INDEX,
     GROUP_LIST,
@@ -15,6 +22,7 @@ from posts.tests.constants import (
     SMALL_GIF,
     TEMP_MEDIA_ROOT
 )
+from posts.utils import COMMENTS_PER_PAGE, ELLIPSIS, CachedCountPaginator
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -58,6 +66,9 @@ class PostsViewsTests(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        cache.clear()
+
     def test_post_template(self):
         """URL-адрес использует соответствующий шаблон."""
         for reverse_name, template in self.templates_pages_names:
@@ -155,12 +166,180 @@ class PostsViewsTests(TestCase):
             text=self.post.text, author=self.user
         )
         first = self.authorized_client.get(INDEX)
-        post_cache.delete()
+        # Правка в обход сигналов не меняет поколение: фрагмент из кэша.
+        Post.objects.filter(pk=post_cache.pk).update(text='Обновлённый')
         second = self.authorized_client.get(INDEX)
         self.assertEqual(first.content, second.content)
-        cache.clear()
+        post_cache.delete()
         third = self.authorized_client.get(INDEX)
         self.assertNotEqual(third.content, second.content)
+        cache.clear()
+        fourth = self.authorized_client.get(INDEX)
+        self.assertEqual(third.content, fourth.content)
+
+    def test_cache_generations(self):
+        """Изменения постов, комментариев и групп меняют поколения лент."""
+        old_group = Group.objects.create(title='Старая', slug='old-slug')
+        feeds = ('index', f'author:{self.user.pk}',
+                 f'group:{self.group.pk}', f'group:{old_group.pk}',
+                 f'post:{self.post.pk}')
+        changes = (
+            (lambda: Post.objects.create(
+                text='Новый', author=self.user, group=self.group),
+             feeds[:3]),
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.user, text='Ок'),
+             feeds[4:]),
+            (lambda: self.group.save(), feeds[:3]),
+        )
+        for change, changed in changes:
+            with self.subTest(changed=changed):
+                before = dict(zip(feeds, get_generations(*feeds)))
+                change()
+                after = dict(zip(feeds, get_generations(*feeds)))
+                for feed in feeds:
+                    if feed in changed:
+                        self.assertGreater(after[feed], before[feed])
+                    else:
+                        self.assertEqual(after[feed], before[feed])
+
+    def test_page_cache(self):
+        """Гостям страницы отдаются из кэша до изменения их лент."""
+        pages = (
+            (INDEX, 0),
+            (GROUP_LIST, 1),
+            (PROFILE, 1),
+            (self.POST_DETAIL, 1),
+        )
+        for page, queries in pages:
+            with self.subTest(page=page):
+                first = self.guest_client.get(page)
+                with self.assertNumQueries(queries):
+                    second = self.guest_client.get(page)
+                self.assertEqual(first.content, second.content)
+        stats = page_cache_stats(PAGE_CACHE_VIEWS)
+        for view in ('index', 'group_posts', 'profile', 'post_detail'):
+            self.assertEqual(stats[view], (1, 1))
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий')
+        self.assertContains(
+            self.guest_client.get(self.POST_DETAIL), 'Свежий комментарий')
+        Post.objects.create(text='Свежий пост', author=self.user)
+        for page in (INDEX, PROFILE):
+            with self.subTest(page=page):
+                self.assertContains(self.guest_client.get(page), 'Свежий пост')
+
+    def test_page_cache_bypass(self):
+        """Авторизованным и с другим query string страница не из кэша."""
+        self.guest_client.get(INDEX)
+        self.authorized_client.get(INDEX)
+        self.guest_client.get(INDEX, {'page': 2})
+        self.assertEqual(
+            page_cache_stats(['index'])['index'], (0, 2))
+
+    def test_conditional_get(self):
+        """Неизменившиеся страницы отдаются ответом 304 без шаблонов."""
+        for page in (GROUP_LIST, PROFILE, self.POST_DETAIL):
+            with self.subTest(page=page):
+                response = self.guest_client.get(page)
+                with self.assertNumQueries(1):
+                    not_modified = self.guest_client.get(
+                        page, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified.templates, [])
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_conditional_get_changes(self):
+        """Правка поста и новый комментарий меняют валидаторы."""
+        etags = {
+            page: self.guest_client.get(page)['ETag']
+            for page in (GROUP_LIST, PROFILE, self.POST_DETAIL)
+        }
+        self.authorized_client.post(
+            self.POST_EDIT, {'text': 'Исправлено', 'group': self.group.pk})
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Исправлено')
+        etag = self.guest_client.get(self.POST_DETAIL)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='Ок')
+        response = self.guest_client.get(
+            self.POST_DETAIL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(
+            self.authorized_client.get(self.POST_DETAIL)['ETag'],
+            response['ETag']
+        )
+
+    def test_conditional_get_other_changes(self):
+        """Удаление поста и подписка тоже меняют ETag."""
+        pages = (GROUP_LIST, PROFILE)
+        post = Post.objects.create(
+            text='Удалим', author=self.user, group=self.group)
+        etags = {page: self.guest_client.get(page)['ETag'] for page in pages}
+        post.delete()
+        for page, etag in etags.items():
+            with self.subTest(page=page):
+                response = self.guest_client.get(
+                    page, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        etag = self.guest_client.get(PROFILE)['ETag']
+        Follow.objects.create(
+            user=User.objects.create(username='fan'), author=self.user)
+        response = self.guest_client.get(PROFILE, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_rename(self):
+        """Переименование автора сбрасывает все страницы с его постами."""
+        pages = (INDEX, GROUP_LIST, self.POST_DETAIL)
+        for page in pages:
+            self.guest_client.get(page)
+        etag = self.guest_client.get(self.POST_DETAIL)['ETag']
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Переименованный'
+        user.save()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(
+                    self.guest_client.get(page), 'Переименованный')
+        response = self.guest_client.get(
+            self.POST_DETAIL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_group_change(self):
+        """Перенос поста в другую группу сбрасывает обе ленты групп."""
+        old_group = Group.objects.create(title='Старая', slug='old-slug')
+        post = Post.objects.create(
+            text='Переезд', author=self.user, group=old_group)
+        old_url = reverse('posts:group_list', args=[old_group.slug])
+        self.assertContains(self.guest_client.get(old_url), 'Переезд')
+        post.group = self.group
+        post.save()
+        self.assertNotContains(self.guest_client.get(old_url), 'Переезд')
+        self.assertContains(self.guest_client.get(GROUP_LIST), 'Переезд')
+
+    def test_comments_chunks(self):
+        """Комментарии выводятся порциями, следующие — фрагментами."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Коммент {i}')
+            for i in range(COMMENTS_PER_PAGE + 5)
+        )
+        comments = self.guest_client.get(
+            self.POST_DETAIL).context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertTrue(comments.has_next())
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, {'after': comments.next_cursor})
+        self.assertTemplateUsed(response, 'includes/comments_chunk.html')
+        rest = response.context['comments']
+        self.assertEqual(len(rest), 5)
+        self.assertFalse(rest.has_next())
+        self.assertTrue(set(comments).isdisjoint(rest))
+        self.assertNotContains(response, 'comments-more')
 
     def test_only_authorized_user_comment(self):
         """Комментировать посты может только авторизованный пользователь."""
@@ -193,6 +372,9 @@ class PaginatorViewsTest(TestCase):
             ) for i in range(13)]
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator(self):
         """Проверяем пагинатор. Вывод по 10 постов на странице."""
         pages = [INDEX, GROUP_LIST, PROFILE]
@@ -204,6 +386,121 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(page + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
 
+    def test_cursor_paginator(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        pages = [INDEX, GROUP_LIST, PROFILE]
+        for page in pages:
+            with self.subTest(page=page):
+                first = self.client.get(page).context['page_obj']
+                second = self.client.get(
+                    page, {'after': first.next_cursor}).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                self.assertTrue(set(first).isdisjoint(second))
+                back = self.client.get(
+                    page, {'before': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+                self.assertFalse(back.has_previous())
+
+    def test_infinite_scroll(self):
+        """Фрагмент отдаёт следующие карточки и ссылку на следующие."""
+        pages = (
+            (INDEX, reverse('posts:index_chunk')),
+            (GROUP_LIST, reverse('posts:group_chunk', args=[SLUG])),
+            (PROFILE, reverse('posts:profile_chunk', args=[USERNAME])),
+        )
+        for page, chunk in pages:
+            with self.subTest(page=page):
+                first = self.client.get(page)
+                cursor = first.context['page_obj'].next_cursor
+                self.assertContains(first, f'{chunk}?after={cursor}')
+                response = self.client.get(chunk, {'after': cursor})
+                self.assertTemplateNotUsed(response, 'base.html')
+                self.assertEqual(len(response.context['page_obj']), 3)
+                self.assertNotContains(response, 'posts-more')
+                self.assertFalse(response.has_header('X-Next-Cursor'))
+                head = self.client.get(chunk)
+                self.assertContains(head, 'posts-more')
+                self.assertEqual(head['X-Next-Cursor'], cursor)
+
+    def test_chunk_cache(self):
+        """Фрагмент кэшируется по курсору для всех до нового поста."""
+        chunk = reverse('posts:index_chunk')
+        cursor = self.client.get(chunk)['X-Next-Cursor']
+        self.client.get(chunk, {'after': cursor})
+        with self.assertNumQueries(0):
+            self.client.get(chunk, {'after': cursor})
+        self.client.force_login(self.user)
+        with self.assertNumQueries(0):
+            self.client.get(chunk, {'after': cursor})
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(chunk, {'after': cursor})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_follow_chunk(self):
+        """Ленту подписок тоже можно листать фрагментами."""
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        cursor = self.client.get(
+            reverse('posts:follow_index')).context['page_obj'].next_cursor
+        response = self.client.get(
+            reverse('posts:follow_chunk'), {'after': cursor})
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_broken_cursor(self):
+        """Битый курсор открывает первую страницу."""
+        response = self.client.get(INDEX, {'after': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_feed_count_cache(self):
+        """Число постов кэшируется и сбрасывается при создании поста."""
+        # Авторизованному пользователю страницы рендерятся без кэша.
+        self.client.force_login(self.user)
+        self.client.get(PROFILE)
+        Post.objects.bulk_create([Post(text='Без сигналов', author=self.user)])
+        response = self.client.get(PROFILE)
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+        Post.objects.create(text='Новый пост', author=self.user)
+        response = self.client.get(PROFILE)
+        self.assertEqual(response.context['page_obj'].paginator.count, 15)
+
+    def test_page_window(self):
+        """Ссылки выводятся только вокруг текущей страницы."""
+        paginator = CachedCountPaginator(list(range(1000)), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, ELLIPSIS, 47, 48, 49, 50, 51, 52, 53, ELLIPSIS, 100]
+        )
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, 5, ELLIPSIS, 100]
+        )
+
+    def test_feed_queries(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        other = User.objects.create(username='other')
+        post = Post.objects.create(
+            text='Чужой пост', author=other, group=self.group)
+        Comment.objects.bulk_create(
+            Comment(post=post, author=author, text='Комментарий')
+            for author in (self.user, other)
+        )
+        # Кроме самой ленты: поиск группы, автора или поста для валидаторов
+        # условного GET и ключа кэша страницы, один на запрос.
+        pages = (
+            (INDEX, 2),
+            (GROUP_LIST, 4),
+            (PROFILE, 4),
+            (reverse('posts:post_detail', args=[post.pk]), 3),
+        )
+        for page, queries in pages:
+            with self.subTest(page=page):
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    self.client.get(page)
+
     def test_return_post(self):
         """Проверяем последовательность постов на странице."""
         self.assertEqual(
@@ -215,6 +512,7 @@ class PaginatorViewsTest(TestCase):
 
 class FollowTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client_follower = Client()
         self.client_following = Client()
         self.user_follower = User.objects.create(username='follower')
@@ -269,3 +567,177 @@ class FollowTests(TestCase):
         response = self.client_following.get(reverse('posts:follow_index'))
         posts_cnt_new = len(response.context['page_obj'].object_list)
         self.assertEqual(posts_cnt_new, 0)
+
+    def test_timeline_fan_out(self):
+        """Новый пост автора раскладывается в ленты подписчиков."""
+        post = Post.objects.create(
+            author=self.user_following, text='Свежая запись')
+        self.assertTrue(Timeline.objects.filter(
+            user=self.user_follower, post=post).exists())
+        self.assertFalse(Timeline.objects.filter(
+            user=self.user_following, post=post).exists())
+
+    def test_timeline_backfill_and_prune(self):
+        """Подписка переносит старые посты в ленту, отписка убирает их."""
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user_following)
+        self.assertTrue(Timeline.objects.filter(
+            user=reader, post=self.post).exists())
+        Follow.objects.filter(user=reader).delete()
+        self.assertFalse(Timeline.objects.filter(user=reader).exists())
+
+    def test_follow_page_cursor(self):
+        """Лента подписок листается курсорами."""
+        Post.objects.bulk_create(
+            Post(author=self.user_following, text=f'Пост {i}')
+            for i in range(12)
+        )
+        Follow.objects.all().delete()
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        url = reverse('posts:follow_index')
+        first = self.client_follower.get(url).context['page_obj']
+        second = self.client_follower.get(
+            url, {'after': first.next_cursor}).context['page_obj']
+        self.assertEqual(len(first), 10)
+        self.assertEqual(len(second), 3)
+        self.assertTrue(set(first).isdisjoint(second))
+
+    @override_settings(FEED_FANOUT_THRESHOLD=0)
+    def test_hybrid_feed(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        cache.clear()
+        post = Post.objects.create(
+            author=self.user_following, text='Для всех подписчиков')
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        response = self.client_follower.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post, self.post])
+
+    def test_fanout_threshold_crossing(self):
+        """Посты не теряются, когда автор пересекает порог в обе стороны."""
+        reader = User.objects.create(username='reader')
+        with override_settings(FEED_FANOUT_THRESHOLD=0):
+            cache.clear()
+            popular = Post.objects.create(
+                author=self.user_following, text='Пока автор популярен')
+            Follow.objects.create(user=reader, author=self.user_following)
+        cache.clear()
+        regular = Post.objects.create(
+            author=self.user_following, text='Снова обычный автор')
+        self.assertFalse(popular.fanned_out)
+        self.assertTrue(regular.fanned_out)
+        client = Client()
+        client.force_login(reader)
+        for user_client in (self.client_follower, client):
+            with self.subTest(client=user_client):
+                response = user_client.get(reverse('posts:follow_index'))
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    [regular, popular, self.post]
+                )
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_merged_feed_numbered_page(self):
+        """Дальняя страница слитой ленты совпадает с общей сортировкой."""
+        popular = User.objects.create(username='popular')
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}', fanned_out=fanned_out)
+            for i in range(12)
+            for author, fanned_out in (
+                (self.user_following, True), (popular, False))
+        )
+        Follow.objects.all().delete()
+        for author in (self.user_following, popular):
+            Follow.objects.create(user=self.user_follower, author=author)
+        expected = list(Post.objects.filter(
+            author__in=(self.user_following, popular))[10:20])
+        response = self.client_follower.get(
+            reverse('posts:follow_index'), {'page': 2})
+        self.assertEqual(list(response.context['page_obj']), expected)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_many_popular_authors(self):
+        """Запросов ленты не больше с ростом числа популярных авторов."""
+        authors = [
+            User.objects.create(username=f'popular{i}') for i in range(6)
+        ]
+        Post.objects.bulk_create(
+            Post(author=author, text=f'Пост {i}', fanned_out=False)
+            for i in range(4)
+            for author in authors
+        )
+        for author in authors:
+            Follow.objects.create(user=self.user_follower, author=author)
+        expected = [
+            post.pk for post in Post.objects.filter(
+                author__in=[self.user_following, *authors])
+        ]
+        pages = (
+            (reverse('posts:follow_index'), {}, expected[:10]),
+            (reverse('posts:follow_index'), {'page': 2}, expected[10:20]),
+            (reverse('posts:follow_chunk'), {}, expected[:10]),
+        )
+        for url, params, page in pages:
+            with self.subTest(url=url, params=params):
+                cache.clear()
+                response = self.client_follower.get(url, params)
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']], page)
+        cache.clear()
+        response = self.client_follower.get(
+            reverse('api_v1:follow_feed'), {'limit': 10})
+        self.assertEqual(
+            [post['id'] for post in response.json()['results']],
+            expected[:10])
+
+
+class SharedCacheTests(TestCase):
+    """Поколения, сдвинутые командой в другом процессе, видны вью."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text='Старый текст')
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        shared = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': self.cache_dir,
+        }})
+        shared.enable()
+        self.addCleanup(shared.disable)
+        self.client.force_login(self.user)
+
+    def bump_feeds(self, *feeds):
+        subprocess.run(
+            [sys.executable, 'manage.py', 'bump_feeds', *feeds],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'CACHE_DIR': self.cache_dir},
+            check=True,
+            capture_output=True,
+        )
+
+    def test_command_bump(self):
+        self.client.get(INDEX)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertNotContains(self.client.get(INDEX), 'Без сигналов')
+        self.bump_feeds('index')
+        self.assertContains(self.client.get(INDEX), 'Без сигналов')
+
+    def test_command_bump_page(self):
+        self.client.logout()
+        self.client.get(PROFILE)
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигналов')
+        self.assertNotContains(self.client.get(PROFILE), 'Без сигналов')
+        self.bump_feeds(f'author:{self.user.pk}')
+        self.assertContains(self.client.get(PROFILE), 'Без сигналов')
+        self.assertEqual(page_cache_stats(['profile'])['profile'], (1, 2))
+
+    def test_process_local_cache(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            with self.assertRaises(CommandError):
+                call_command('bump_feeds', 'index')
@@ -0,0 +1,339 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Миниатюры всех размеров из RENDITIONS и их варианты для srcset
+(VARIANT_WIDTHS, в WebP, если Pillow его умеет) создаются сразу после
+сохранения картинки в пуле процессов, а не лениво внутри запроса
+первого читателя.
+Шаблоны берут только готовые миниатюры (тег post_thumbnail) и, пока
+генерация не закончилась, показывают исходную картинку; после генерации
+поколения лент с постом сдвигаются, и кэш страниц обновляется.
+Миниатюры уже опубликованных постов создаёт команда generate_thumbnails.
+"""
+import functools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from PIL import features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as thumbnail_defaults
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.workers import setup_django
+from posts.cache import bump_generations, increment, public_feeds
+from posts.storage import content_storage
+
+logger = logging.getLogger(__name__)
+
+# Размеры миниатюр: карточка в лентах и картинка на странице поста.
+# Страница поста раньше растягивала картинку до 4000px; теперь она
+# ограничена 1200px и маленькие картинки не увеличиваются.
+RENDITIONS = {
+    'card': ('400x400', {'upscale': True}),
+    'detail': ('1200x1200', {'upscale': False}),
+}
+# Ширины вариантов каждого размера для srcset — не больше основного
+# размера, чтобы srcset только экономил байты, — и доля ширины окна,
+# которую картинка занимает от заданной ширины окна (атрибут sizes).
+VARIANT_WIDTHS = {
+    'card': (160, 240, 400),
+    'detail': (480, 800, 1200),
+}
+SIZES = {
+    'card': ((None, 30),),
+    'detail': ((768, 75), (None, 100)),
+}
+PENDING_TIMEOUT = 60 * 5
+THUMBNAIL_COUNTERS = ('batch_lookups', 'batched_posts', 'single_lookups')
+
+_executor = None
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище метаданных sorl-thumbnail без кэширования промахов.
+
+    Миниатюру создаёт другой процесс, и закэшированный промах скрывал бы
+    её от этого процесса, пока не истечёт THUMBNAIL_CACHE_TIMEOUT.
+    """
+
+    def _get_raw(self, key):
+        value = self.cache.get(key)
+        if value is None or value == cached_db_kvstore.EMPTY_VALUE:
+            value = KVStoreModel.objects.filter(
+                key=key).values_list('value', flat=True).first()
+            if value is None:
+                return None
+            self.cache.set(
+                key, value, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+        return value
+
+    def get_many(self, image_files):
+        """Метаданные нескольких картинок одним чтением: {key: ImageFile}.
+
+        Сначала из кэша одним get_many, промахи — одним запросом к БД.
+        """
+        keys = {add_prefix(image_file.key, 'image'): image_file.key
+                for image_file in image_files}
+        found = {
+            key: value for key, value in self.cache.get_many(keys).items()
+            if value != cached_db_kvstore.EMPTY_VALUE
+        }
+        missing = [key for key in keys if key not in found]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            self.cache.set_many(
+                stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            found.update(stored)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in found.items() if value
+        }
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который умеет не генерировать миниатюру."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, который создал бы get_thumbnail, без генерации."""
+        # Параметры дополняются так же, как в ThumbnailBackend.get_thumbnail,
+        # иначе имя файла миниатюры не совпадёт.
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(thumbnail_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища метаданных или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+
+backend = ReadyThumbnailBackend()
+
+
+def modern_formats():
+    """Форматы вариантов помимо обычного JPEG, которые умеет Pillow.
+
+    AVIF в Pillow 8 не поддерживается вовсе, WebP — при сборке с libwebp.
+    """
+    return ('WEBP',) if features.check('webp') else ()
+
+
+def variants(rendition):
+    """Варианты размера rendition: (формат, ширина, геометрия, параметры).
+
+    Формат None — формат миниатюр по умолчанию.
+    """
+    _, options = RENDITIONS[rendition]
+    for image_format in (*modern_formats(), None):
+        for width in VARIANT_WIDTHS[rendition]:
+            variant = {**options}
+            if image_format is not None:
+                variant['format'] = image_format
+            yield image_format, width, f'{width}x{width}', variant
+
+
+def sizes(rendition):
+    """Значение атрибута sizes для размера rendition."""
+    return ', '.join(
+        f'(min-width: {min_width}px) {share}vw' if min_width else f'{share}vw'
+        for min_width, share in SIZES[rendition]
+    )
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки name (путь в хранилище медиа)."""
+    # Ключ миниатюры включает хранилище исходника, поэтому оно то же,
+    # что у Post.image.
+    source = ImageFile(name, content_storage)
+    for rendition, (geometry, options) in RENDITIONS.items():
+        get_thumbnail(source, geometry, **options)
+        for _, _, variant_geometry, variant_options in variants(rendition):
+            get_thumbnail(source, variant_geometry, **variant_options)
+    return name
+
+
+def pending_key(name):
+    return f'thumbnail_pending:{name}'
+
+
+def executor():
+    """Пул процессов для генерации, создаётся при первой задаче.
+
+    Процессы запускаются через spawn: форк унаследовал бы соединения
+    с БД родителя.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=setup_django,
+            initargs=(connection.settings_dict['NAME'],)
+        )
+    return _executor
+
+
+def reset_executor():
+    """Забывает сломанный пул: следующая задача создаст новый."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def in_process():
+    """Генерировать ли миниатюры в текущем процессе, а не в пуле.
+
+    Пул отключается THUMBNAIL_WORKERS = 0; базу SQLite в памяти
+    (например, тестовую) процессы пула не видят.
+    """
+    return not settings.THUMBNAIL_WORKERS or (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def finished(name, feeds, future=None):
+    """Сбрасывает кэш лент, где пост показывался с исходной картинкой."""
+    cache.delete(pending_key(name))
+    if future is not None and future.exception() is not None:
+        if isinstance(future.exception(), BrokenProcessPool):
+            reset_executor()
+        logger.error(
+            'Не удалось создать миниатюры %s', name,
+            exc_info=future.exception()
+        )
+        return
+    bump_generations(*feeds)
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр картинки поста в очередь.
+
+    Если пул отключён или сломан (умер процесс пула, интерпретатор
+    завершается), миниатюры создаются сразу в этом процессе.
+    """
+    name = post.image.name
+    if not name or not cache.add(pending_key(name), True, PENDING_TIMEOUT):
+        return
+    feeds = [*public_feeds(post), f'post:{post.pk}']
+    if not in_process():
+        try:
+            executor().submit(generate, name).add_done_callback(
+                functools.partial(finished, name, feeds))
+            return
+        except (BrokenProcessPool, RuntimeError):
+            logger.warning(
+                'Пул миниатюр недоступен, %s обрабатывается в процессе',
+                name, exc_info=True
+            )
+            reset_executor()
+    try:
+        generate(name)
+    except Exception:
+        cache.delete(pending_key(name))
+        raise
+    finished(name, feeds)
+
+
+def prefetch_thumbnails(posts, rendition):
+    """Находит готовые миниатюры всех постов страницы одним чтением.
+
+    Основной размер кладётся в post.thumbnails, варианты для srcset —
+    в post.variants; оттуда их берут ready_thumbnail и ready_variants,
+    не обращаясь к хранилищу метаданных по каждому посту.
+    """
+    loaded = load_thumbnails(posts, rendition)
+    if loaded:
+        increment('thumbnail_stats:batch_lookups')
+        increment('thumbnail_stats:batched_posts', loaded)
+
+
+def load_thumbnails(posts, rendition):
+    """prefetch_thumbnails без статистики; возвращает число постов."""
+    geometry, options = RENDITIONS[rendition]
+    wanted = {
+        post: (
+            backend.thumbnail_file(post.image, geometry, **options),
+            [
+                (image_format, backend.thumbnail_file(
+                    post.image, variant_geometry, **variant_options))
+                for image_format, _, variant_geometry, variant_options
+                in variants(rendition)
+            ]
+        )
+        for post in posts if post.image
+    }
+    if not wanted:
+        return 0
+    ready = default.kvstore.get_many([
+        thumbnail
+        for main, post_variants in wanted.values()
+        for thumbnail in (main, *(variant for _, variant in post_variants))
+    ])
+    for post, (main, post_variants) in wanted.items():
+        post.thumbnails = {
+            **getattr(post, 'thumbnails', {}),
+            rendition: ready.get(main.key)
+        }
+        post.variants = {
+            **getattr(post, 'variants', {}),
+            rendition: [
+                (image_format, ready[variant.key])
+                for image_format, variant in post_variants
+                if variant.key in ready
+            ]
+        }
+    return len(wanted)
+
+
+def ready_thumbnail(post, rendition):
+    """Готовая миниатюра картинки поста или None, пока её нет."""
+    if not post.image:
+        return None
+    prefetched = getattr(post, 'thumbnails', {})
+    if rendition in prefetched:
+        return prefetched[rendition]
+    increment('thumbnail_stats:single_lookups')
+    geometry, options = RENDITIONS[rendition]
+    return backend.get_ready_thumbnail(post.image, geometry, **options)
+
+
+def ready_variants(post, rendition):
+    """Готовые варианты размера поста: [(формат, миниатюра)].
+
+    Если страница их не подгрузила, они читаются одним запросом,
+    который в статистике считается чтением по одному посту.
+    """
+    if not post.image:
+        return []
+    if rendition not in getattr(post, 'variants', {}):
+        increment('thumbnail_stats:single_lookups')
+        load_thumbnails([post], rendition)
+    return post.variants[rendition]
+
+
+def thumbnail_stats():
+    """Счётчики чтений метаданных миниатюр: пакетных и по одному посту."""
+    keys = [f'thumbnail_stats:{name}' for name in THUMBNAIL_COUNTERS]
+    found = cache.get_many(keys)
+    return {
+        name: found.get(key, 0)
+        for name, key in zip(THUMBNAIL_COUNTERS, keys)
+    }
@@ -0,0 +1,255 @@
+"""Лента подписок: гибрид fan-out on write и fan-out on read.
+
+Пост обычного автора при публикации раскладывается в Timeline каждого
+подписчика, и такая часть ленты читается одним диапазоном по индексу
+(user, -created, -post). Авторов, у которых подписчиков больше
+FEED_FANOUT_THRESHOLD, раскладывать слишком дорого: их посты остаются
+с Post.fanned_out=False и подмешиваются при чтении k-way слиянием
+отсортированных потоков. Решение принимается один раз, при публикации,
+поэтому автор может пересекать порог в обе стороны: каждый пост всегда
+лежит ровно в одной из двух частей ленты.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from posts.models import Follow, Post, Profile, Timeline
+
+BATCH_SIZE = 500
+TIMELINE_KEYS = ('created', 'post_id')
+CELEBRITIES_KEY = 'feed_celebrities'
+CELEBRITIES_TIMEOUT = 60 * 10
+
+
+def fanout_threshold():
+    return getattr(settings, 'FEED_FANOUT_THRESHOLD', 1000)
+
+
+def celebrities():
+    """Id авторов, чьи посты не раскладываются по лентам подписчиков.
+
+    Множество кэшируется, чтобы запись и чтение ленты решали одинаково.
+    """
+    authors = cache.get(CELEBRITIES_KEY)
+    if authors is None:
+        authors = set(
+            Profile.objects.filter(
+                followers_count__gt=fanout_threshold()
+            ).values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, authors, CELEBRITIES_TIMEOUT)
+    return authors
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    if not post.fanned_out:
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post=post, created=post.created)
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out_many(posts):
+    """Раскладывает по лентам подписчиков посты, добавленные без сигналов.
+
+    Подписчики всех авторов читаются одним запросом, посты — потоком.
+    """
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+            author__in=posts.values('author')).values_list(
+            'user_id', 'author_id').iterator():
+        followers.setdefault(author_id, []).append(user_id)
+    rows = posts.filter(
+        fanned_out=True, author_id__in=followers
+    ).values_list('id', 'author_id', 'created')
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post_id=pk, created=created)
+            for pk, author_id, created in rows.iterator()
+            for user_id in followers[author_id]
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    """Переносит в ленту подписчика уже разложенные посты автора.
+
+    Остальные посты автора подтягивает timeline_feed при чтении.
+    """
+    posts = Post.objects.filter(
+        author_id=author_id, fanned_out=True).values_list('id', 'created')
+    Timeline.objects.bulk_create(
+        (
+            Timeline(user_id=user_id, post_id=pk, created=created)
+            for pk, created in posts.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    Timeline.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+class TimelineFeed:
+    """Посты ленты подписок поверх запроса к Timeline.
+
+    Умеет ровно то, что нужно пагинаторам: count(), срезы, order_by()
+    и filter() по ключам TIMELINE_KEYS. Срез возвращает список постов.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+
+    def count(self):
+        return self.entries.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [entry.post for entry in self.entries[index]]
+        return self.entries[index].post
+
+    def order_by(self, *fields):
+        return TimelineFeed(self.entries.order_by(*fields))
+
+    def filter(self, *args, **kwargs):
+        return TimelineFeed(self.entries.filter(*args, **kwargs))
+
+    def keys(self, stop):
+        return self.entries.values_list(*TIMELINE_KEYS)[:stop]
+
+
+class PostFeed:
+    """Неразложенные посты с ключами TIMELINE_KEYS для слияния с Timeline.
+
+    Ключ post_id — аннотация, а с ней COUNT шёл бы через подзапрос,
+    поэтому число постов считается по запросу counted без неё.
+    """
+
+    def __init__(self, posts, counted):
+        self.posts = posts
+        self.counted = counted
+
+    def count(self):
+        return self.counted.count()
+
+    def __getitem__(self, index):
+        return self.posts[index]
+
+    def order_by(self, *fields):
+        return PostFeed(self.posts.order_by(*fields), self.counted)
+
+    def filter(self, *args, **kwargs):
+        return PostFeed(self.posts.filter(*args, **kwargs), self.counted)
+
+    def keys(self, stop):
+        return self.posts.values_list(*TIMELINE_KEYS)[:stop]
+
+
+class MergedFeed:
+    """K-way слияние нескольких лент, отсортированных по TIMELINE_KEYS.
+
+    Каждый поток отдаёт не больше stop постов, heapq.merge сливает их
+    без полной сортировки. Для дальних страниц сначала сливаются только
+    ключи, и целиком читаются лишь посты самой страницы. Потоки
+    не пересекаются, поэтому count() — просто сумма их длин.
+    """
+
+    def __init__(self, streams, descending=True):
+        self.streams = streams
+        self.descending = descending
+
+    def count(self):
+        return sum(stream.count() for stream in self.streams)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        streams = self.streams
+        if index.start:
+            rows = list(islice(
+                self.merge(
+                    [(created, pk, number)
+                     for created, pk in stream.keys(index.stop)]
+                    for number, stream in enumerate(streams)
+                ),
+                index.start, index.stop
+            ))
+            # Посты читаются только из потоков, попавших на страницу.
+            streams = [
+                stream.filter(post_id__in=[
+                    pk for created, pk, source in rows if source == number
+                ])
+                for number, stream in enumerate(streams)
+                if any(source == number for *keys, source in rows)
+            ]
+            index = slice(None, len(rows))
+        posts = self.merge(
+            [(post.created, post.pk, post) for post in stream[:index.stop]]
+            for stream in streams
+        )
+        return [post for created, pk, post in islice(posts, index.stop)]
+
+    def merge(self, streams):
+        """Сливает потоки кортежей, начинающихся с ключей (created, pk)."""
+        return heapq.merge(
+            *streams,
+            key=lambda row: row[:2],
+            reverse=self.descending
+        )
+
+    def order_by(self, *fields):
+        return MergedFeed(
+            [stream.order_by(*fields) for stream in self.streams],
+            descending=fields[0].startswith('-')
+        )
+
+    def filter(self, *args, **kwargs):
+        return MergedFeed(
+            [stream.filter(*args, **kwargs) for stream in self.streams],
+            self.descending
+        )
+
+
+def timeline_feed(user):
+    """Лента подписок пользователя.
+
+    Материализованная часть читается из Timeline, неразложенные посты
+    всех авторов, на которых подписан пользователь, читаются одним
+    запросом, и два потока сливаются при чтении.
+    """
+    feed = TimelineFeed(
+        Timeline.objects.filter(user=user).select_related(
+            'post', 'post__author', 'post__group')
+    )
+    unfanned = Post.objects.filter(
+        fanned_out=False,
+        author__in=Follow.objects.filter(user=user).values('author')
+    )
+    pulled = PostFeed(
+        unfanned.select_related('author', 'group').annotate(post_id=F('id')),
+        unfanned
+    )
+    return MergedFeed([feed, pulled])
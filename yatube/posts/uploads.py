@@ -0,0 +1,136 @@
+"""Приём картинок постов: ограничение размера и перекодирование.
+
+Загрузка проходит два этапа. LimitedUploadHandler, который вью форм
+постов ставят декоратором limit_uploads, при разборе запроса
+перестаёт сохранять файл, как только тот превысил POST_IMAGE_MAX_BYTES,
+и отдаёт вместо него RejectedUpload без содержимого, поэтому ни память,
+ни временные файлы не растут вместе с присланным файлом. Принятую
+картинку process_image уменьшает до POST_IMAGE_MAX_EDGE по длинной
+стороне, поворачивает по EXIF и сохраняет заново без метаданных.
+"""
+import functools
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps, features
+
+JPEG_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+PNG_OPTIONS = {'optimize': True}
+WEBP_OPTIONS = {'quality': 80, 'method': 4}
+
+
+class RejectedUpload(UploadedFile):
+    """Файл больше допустимого: известны имя и размер, содержимого нет."""
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        super().__init__(None, name, content_type, size, charset,
+                         content_type_extra)
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    """Не передаёт дальше байты файла сверх POST_IMAGE_MAX_BYTES.
+
+    Остаток запроса дочитывается, чтобы разобрать остальные поля формы,
+    но следующие обработчики (в память или во временный файл) его уже
+    не получают.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.received <= settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return RejectedUpload(
+            self.file_name, self.content_type, self.received, self.charset,
+            self.content_type_extra
+        )
+
+
+def limit_uploads(view):
+    """Ставит LimitedUploadHandler первым обработчиком загрузок вью.
+
+    Обработчики можно менять, только пока тело запроса не разобрано,
+    а CsrfViewMiddleware читает request.POST раньше вью. Поэтому
+    middleware вью пропускает, а CSRF проверяется внутри, уже после
+    установки обработчика.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers.insert(0, LimitedUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def oversized(upload):
+    return upload.size > settings.POST_IMAGE_MAX_BYTES
+
+
+def output_format(image):
+    """Формат для сохранения: WebP, если Pillow его умеет, иначе JPEG.
+
+    Без WebP картинки с прозрачностью сохраняются в PNG.
+    """
+    if features.check('webp'):
+        return 'WEBP', 'webp', WEBP_OPTIONS
+    if image.mode == 'RGBA' and image.getextrema()[3][0] < 255:
+        return 'PNG', 'png', PNG_OPTIONS
+    return 'JPEG', 'jpg', JPEG_OPTIONS
+
+
+def process_image(upload):
+    """Уменьшенная и перекодированная копия загруженной картинки.
+
+    Число пикселей проверяется по заголовку, до декодирования. JPEG
+    декодируется сразу в уменьшенном масштабе (draft), у анимаций
+    остаётся первый кадр, как и у их миниатюр.
+    """
+    edge = settings.POST_IMAGE_MAX_EDGE
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            if image.width * image.height > settings.POST_IMAGE_MAX_PIXELS:
+                raise ValidationError(
+                    'Слишком большая картинка: не больше %(limit)s '
+                    'мегапикселей.',
+                    code='too_many_pixels',
+                    params={
+                        'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+                )
+            image.draft('RGB', (edge, edge))
+            image = ImageOps.exif_transpose(image)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image')
+    image.thumbnail((edge, edge), reducing_gap=2.0)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image_format, extension, options = output_format(image)
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+    # EXIF, ICC-профиль и комментарии не переносятся в новый файл.
+    image.info.clear()
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{extension}', buffer.getvalue(),
+        content_type=Image.MIME[image_format]
+    )
@@ -1,7 +1,197 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+from datetime import datetime
+from itertools import islice
 
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
 
-def page_navigation(posts, request):
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+from posts.cache import cache_timeout
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+FEED_KEYS = ('created', 'id')
+COUNT_TIMEOUT = 60 * 15
+PAGE_WINDOW = 3
+ELLIPSIS = '…'
+
+
+def chunked(iterable, size):
+    """Списки по size элементов из iterable, не читая его целиком."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def count_cache_key(feed):
+    return f'feed_count:{feed}'
+
+
+def invalidate_feed_counts(*feeds):
+    """Сбрасывает закэшированное число постов в переданных лентах."""
+    cache.delete_many([count_cache_key(feed) for feed in feeds])
+
+
+def encode_position(created, pk):
+    """Кодирует позицию (created, id) в ленте в непрозрачный токен."""
+    raw = f'{created.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def encode_cursor(post):
+    """Токен позиции поста в ленте."""
+    return encode_position(post.created, post.pk)
+
+
+def decode_cursor(token):
+    """Возвращает пару (created, id) из токена или None, если он битый."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created, pk = raw.decode().split('|')
+        return datetime.fromisoformat(created), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def keyset_filter(keys, position, backwards=False):
+    """Условие «строго после позиции» для ленты, отсортированной по keys.
+
+    Внешнее created <= (>=) позиции даёт планировщику границу диапазона
+    по индексу, OR внутри только разбирает строки с равным created.
+    """
+    created_key, pk_key = keys
+    created, pk = position
+    lookup = 'gt' if backwards else 'lt'
+    return Q(**{f'{created_key}__{lookup}e': created}) & (
+        Q(**{f'{created_key}__{lookup}': created})
+        | Q(**{f'{pk_key}__{lookup}': pk})
+    )
+
+
+class CursorPage(Page):
+    """Страница ленты без номера: соседние страницы задаются курсорами."""
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return (
+            f'<CursorPage after={self.previous_cursor} '
+            f'before={self.next_cursor}>'
+        )
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу (created, id) одним запросом по индексу.
+
+    В отличие от Paginator, не считает COUNT(*) и не использует OFFSET,
+    поэтому глубокие страницы обходятся так же дёшево, как первая.
+    keys — пути полей, значения которых совпадают с post.created и post.id.
+    """
+
+    def __init__(self, object_list, per_page, keys=FEED_KEYS):
+        super().__init__(object_list, per_page)
+        self.keys = keys
+
+    def get_cursor_page(self, after=None, before=None):
+        backwards = not after and bool(before)
+        position = decode_cursor(before if backwards else after or '')
+        if position is None:
+            backwards = False
+        order = self.keys if backwards else [f'-{key}' for key in self.keys]
+        posts = self.object_list.order_by(*order)
+        if position is not None:
+            posts = posts.filter(keyset_filter(self.keys, position, backwards))
+        posts = list(posts[:self.per_page + 1])
+        has_more = len(posts) > self.per_page
+        posts = posts[:self.per_page]
+        if backwards:
+            posts.reverse()
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else position is not None
+        return CursorPage(
+            posts,
+            self,
+            encode_cursor(posts[-1]) if posts and has_next else None,
+            encode_cursor(posts[0]) if posts and has_previous else None,
+        )
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который хранит число постов ленты feed в кэше.
+
+    Счётчик сбрасывается сигналами при создании и удалении постов,
+    а между сбросами может быть приблизительным не дольше COUNT_TIMEOUT
+    (с кэшем в памяти процесса — не дольше LOCAL_CACHE_TIMEOUT).
+    """
+
+    def __init__(self, object_list, per_page, feed=None):
+        super().__init__(object_list, per_page)
+        self.feed = feed
+
+    @cached_property
+    def count(self):
+        if self.feed is None:
+            return super().count
+        key = count_cache_key(self.feed)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, cache_timeout(COUNT_TIMEOUT))
+        return count
+
+    def get_elided_page_range(self, number, on_each_side=PAGE_WINDOW):
+        """Номера страниц вокруг текущей, края и ELLIPSIS на месте пропусков.
+
+        Вместо всех num_pages ссылок отдаёт не больше 2 * on_each_side + 5.
+        """
+        last = self.num_pages
+        start = max(number - on_each_side, 1)
+        end = min(number + on_each_side, last)
+        if start > 1:
+            yield 1
+            if start > 2:
+                yield ELLIPSIS
+        yield from range(start, end + 1)
+        if end < last:
+            if end < last - 1:
+                yield ELLIPSIS
+            yield last
+
+
+def page_navigation(posts, request, feed=None, keys=FEED_KEYS):
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        paginator = CursorPaginator(posts, POSTS_PER_PAGE, keys)
+        return paginator.get_cursor_page(after, before)
+    posts = posts.order_by(*[f'-{key}' for key in keys])
+    paginator = CachedCountPaginator(posts, POSTS_PER_PAGE, feed)
+    page = paginator.get_page(request.GET.get('page'))
+    page.page_window = list(paginator.get_elided_page_range(page.number))
+    # Закэшированный счётчик может отставать от ленты, и страница
+    # в пределах num_pages окажется пустой.
+    filled = bool(page.object_list)
+    page.next_cursor = (
+        encode_cursor(page[-1]) if filled and page.has_next() else None
+    )
+    page.previous_cursor = (
+        encode_cursor(page[0]) if filled and page.has_previous() else None
+    )
+    return page
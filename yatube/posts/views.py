@@ -1,32 +1,109 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from core.decorators import conditional_page, query_budget
+from posts.cache import (
+    cache_anonymous_page,
+    group_page_feeds,
+    index_page_feeds,
+    post_page_feeds,
+    profile_page_feeds
+)
+from posts.comment_buffer import CommentNotSaved, comment_buffer
+from posts.conditional import (
+    group_validators, post_validators, profile_validators
+)
+from posts.export import FORMATS, export_filename, export_lines, export_zip
 from posts.forms import PostForm, CommentForm
-from posts.models import Post, Group, Follow, User
-from posts.utils import page_navigation
+from posts.models import Comment, Post, Group, Follow, User
+from posts.search import search_posts
+from posts.timeline import TIMELINE_KEYS, timeline_feed
+from posts.uploads import limit_uploads
+from posts.utils import (
+    COMMENTS_PER_PAGE, FEED_KEYS, POSTS_PER_PAGE, CursorPaginator,
+    page_navigation
+)
 
+# Через сколько секунд повторить комментарий, который буфер не записал.
+COMMENT_RETRY_AFTER = 1
 
+
+def render_posts_chunk(request, posts, chunk_url, keys=FEED_KEYS, **flags):
+    """Следующая порция карточек ленты после ?after= без обвязки страницы.
+
+    Курсор следующей порции — в ссылке «Показать ещё» и в заголовке
+    X-Next-Cursor.
+    """
+    page = CursorPaginator(posts, POSTS_PER_PAGE, keys).get_cursor_page(
+        request.GET.get('after'))
+    context = {
+        'page_obj': page,
+        'chunk_url': chunk_url,
+        **flags
+    }
+    response = render(request, 'includes/posts_chunk.html', context)
+    if page.next_cursor:
+        response['X-Next-Cursor'] = page.next_cursor
+    return response
+
+
+@cache_anonymous_page(index_page_feeds)
+@query_budget(4)
 def index(request):
-    posts = Post.objects.select_related('group')
+    posts = Post.objects.select_related('author', 'group')
     context = {
-        'page_obj': page_navigation(posts, request)
+        'page_obj': page_navigation(posts, request, 'index')
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(index_page_feeds, shared=True)
+@query_budget(1)
+def index_chunk(request):
+    return render_posts_chunk(
+        request,
+        Post.objects.select_related('author', 'group'),
+        reverse('posts:index_chunk'),
+        alll_posts=True,
+        not_a_profile=True
+    )
+
+
+@conditional_page(group_validators)
+@cache_anonymous_page(group_page_feeds)
+@query_budget(5)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('group')
+    posts = group.posts.select_related('author', 'group')
     context = {
         'group': group,
-        'page_obj': page_navigation(posts, request)
+        'page_obj': page_navigation(posts, request, f'group:{group.pk}')
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(group_page_feeds, shared=True)
+@query_budget(2)
+def group_chunk(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return render_posts_chunk(
+        request,
+        group.posts.select_related('author', 'group'),
+        reverse('posts:group_chunk', args=[slug]),
+        not_a_profile=True
+    )
+
+
+@conditional_page(profile_validators)
+@cache_anonymous_page(profile_page_feeds)
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    all_posts = author.posts.all()
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+    all_posts = author.posts.select_related('group')
     following = (
         request.user.is_authenticated
         and Follow.objects.filter(
@@ -35,21 +112,74 @@ def profile(request, username):
     )
     context = {
         'author': author,
-        'page_obj': page_navigation(all_posts, request),
+        'page_obj': page_navigation(
+            all_posts, request, f'author:{author.pk}'),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page(profile_page_feeds, shared=True)
+@query_budget(2)
+def profile_chunk(request, username):
+    author = get_object_or_404(User, username=username)
+    return render_posts_chunk(
+        request,
+        author.posts.select_related('group'),
+        reverse('posts:profile_chunk', args=[username]),
+        alll_posts=True
+    )
+
+
+@conditional_page(post_validators)
+@cache_anonymous_page(post_page_feeds)
+@query_budget(4)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        id=post_id
+    )
     form = CommentForm()
-    posts_comments = post.comments.all()
-    context = {'post': post, 'form': form, 'comments': posts_comments}
+    comments = CursorPaginator(
+        post.comments.select_related('author'), COMMENTS_PER_PAGE
+    ).get_cursor_page()
+    context = {
+        'post': post,
+        'post_id': post.pk,
+        'form': form,
+        'comments': comments
+    }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(1)
+def post_comments(request, post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related('author')
+    context = {
+        'post_id': post_id,
+        'comments': CursorPaginator(
+            comments, COMMENTS_PER_PAGE
+        ).get_cursor_page(request.GET.get('after'))
+    }
+    return render(request, 'includes/comments_chunk.html', context)
+
+
+@query_budget(2)
+def search(request):
+    query = request.GET.get('q', '')
+    context = {
+        'query': query,
+        'results': search_posts(
+            Post.objects.select_related('author', 'group'),
+            query,
+            request.GET.get('after')
+        )
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@limit_uploads
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
@@ -61,6 +191,7 @@ def post_create(request):
 
 
 @login_required
+@limit_uploads
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if post.author != request.user:
@@ -79,6 +210,8 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
+    if settings.COMMENT_BUFFER:
+        return add_buffered_comment(request, post_id)
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
@@ -89,15 +222,79 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def add_buffered_comment(request, post_id):
+    """add_comment при COMMENT_BUFFER: запись пачкой в comment_buffer.
+
+    Существование поста проверяет писатель буфера, один раз на пачку.
+    Если комментарий не записан, ответ — 503 с Retry-After: дубля
+    при повторной отправке не будет.
+    """
+    form = CommentForm(request.POST or None)
+    if form.is_valid():
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post_id = post_id
+        try:
+            comment_buffer.save(comment)
+        except CommentNotSaved as error:
+            response = HttpResponse(str(error), status=503)
+            response['Retry-After'] = str(COMMENT_RETRY_AFTER)
+            return response
+    return redirect('posts:post_detail', post_id=post_id)
+
+
 @login_required
+@query_budget(8)
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('group')
-    context = {'page_obj': page_navigation(posts, request)}
+    context = {
+        'page_obj': page_navigation(
+            timeline_feed(request.user),
+            request,
+            f'follow:{request.user.pk}',
+            TIMELINE_KEYS
+        )
+    }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+@query_budget(6)
+def follow_chunk(request):
+    return render_posts_chunk(
+        request,
+        timeline_feed(request.user),
+        reverse('posts:follow_chunk'),
+        TIMELINE_KEYS,
+        alll_posts=True,
+        not_a_profile=True
+    )
+
+
+@login_required
+@query_budget(4)
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in FORMATS:
+        export_format = 'ndjson'
+    archive = 'zip' in request.GET
+    if archive:
+        response = StreamingHttpResponse(
+            export_zip(author, export_format),
+            content_type='application/zip'
+        )
+    else:
+        response = StreamingHttpResponse(
+            export_lines(author, export_format),
+            content_type=f'{FORMATS[export_format]}; charset=utf-8'
+        )
+    filename = export_filename(author, export_format, archive)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
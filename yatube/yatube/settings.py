@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar'
 ]
@@ -151,7 +152,57 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
-}
+# Поколения лент, счётчики и закэшированные страницы должны быть общими
+# для воркеров gunicorn и команд manage.py: иначе поколение, сдвинутое
+# в одном процессе, другие не увидят. CACHE_DIR включает файловый кэш,
+# общий для процессов на сервере. Без него кэш LocMemCache свой у каждого
+# процесса, и страницы с фрагментами живут не дольше LOCAL_CACHE_TIMEOUT.
+CACHE_DIR = os.getenv('CACHE_DIR')
+if CACHE_DIR:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_DIR,
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        }
+    }
+LOCAL_CACHE_TIMEOUT = 60
 INTERNAL_IPS = ['127.0.0.1',]
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+# при публикации, а подмешиваются в follow_index при чтении.
+FEED_FANOUT_THRESHOLD = 1000
+
+# В разработке и тестах превышение бюджета запросов вью — ошибка,
+# в продакшене — предупреждение в логе core.decorators.
+QUERY_BUDGET_RAISE = DEBUG
+# Хранилище метаданных sorl-thumbnail — кэш, а не данные вью.
+QUERY_BUDGET_IGNORED_TABLES = ('thumbnail_kvstore',)
+# Сколько хранится закэшированная страница для гостей. Устаревшие
+# страницы вытесняются раньше: их ключ содержит поколения лент.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько последних постов отдают ленты RSS и Atom.
+FEED_ITEMS = 50
+# Процессов для фоновой генерации миниатюр; 0 — генерировать сразу
+# в процессе, сохранившем картинку.
+THUMBNAIL_WORKERS = 2
+# Промахи метаданных миниатюр не кэшируются: их пишет пул процессов.
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+# Картинки постов: в формах постов файл больше POST_IMAGE_MAX_BYTES
+# не дочитывается (posts.uploads.limit_uploads), принятые уменьшаются
+# до POST_IMAGE_MAX_EDGE по длинной стороне.
+POST_IMAGE_MAX_BYTES = 10 * 2 ** 20
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+POST_IMAGE_MAX_EDGE = 2048
+# Комментарии пишутся одним потоком пачками до COMMENT_BUFFER_BATCH;
+# вью ждёт, пока писатель возьмёт комментарий, не дольше
+# COMMENT_BUFFER_TIMEOUT секунд, иначе отвечает 503 и его можно повторить.
+COMMENT_BUFFER = False
+COMMENT_BUFFER_BATCH = 200
+COMMENT_BUFFER_TIMEOUT = 10
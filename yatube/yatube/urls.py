@@ -7,6 +7,7 @@ from django.conf import settings
 urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('api/v1/', include('api.urls', namespace='api_v1')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts'))